@@ -0,0 +1,225 @@
+import argparse
+import os
+import shutil
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import matplotlib
+from PIL import Image
+from depth_profiles import (BOOTSTRAP_LEVEL, analyte_frame, date_colorbar, date_ns, date_scale, median_profile,
+                            station_slices)
+from figure_writer import new_figure
+from groundwater_io import ANALYTES, STATION_NUMBERS, load_united_compact, station_code
+from map_layers import basemap_image, draw_basemap, draw_surface, load_circle_data, map_bounds, map_campaigns, to_web_mercator
+
+FRAME_DPI = 100
+DEFAULT_FPS = 2
+# Frames drawn in a row by one worker on its own figure
+CHUNK_SIZE = 8
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def render_frames(n_frames, make_scene, workers=DEFAULT_WORKERS):
+    # make_scene() builds a figure once and returns (fig, update, artists); update(i) only changes the data of
+    # the listed artists. Everything else (basemap, axes, colorbars) is rasterised once per scene and restored
+    # from a saved background; per frame only the listed artists are drawn on top of it.
+    # Each worker thread keeps one scene and renders consecutive chunks of frames with it.
+    # Frames are yielded in order, with at most 2 * workers chunks in memory.
+    local = threading.local()
+
+    def render_chunk(frames):
+        if not hasattr(local, 'scene'):
+            fig, update, artists = make_scene()
+            for artist in artists:
+                artist.set_animated(True)
+            fig.canvas.draw()
+            local.scene = fig, update, artists, fig.canvas.copy_from_bbox(fig.bbox)
+        fig, update, artists, background = local.scene
+        rendered = []
+        for i in frames:
+            fig.canvas.restore_region(background)
+            update(i)
+            for artist in artists:
+                fig.draw_artist(artist)
+            rendered.append(np.asarray(fig.canvas.buffer_rgba()).copy())
+        return rendered
+
+    chunks = [range(start, min(start + CHUNK_SIZE, n_frames)) for start in range(0, n_frames, CHUNK_SIZE)]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='frame-render') as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(render_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def write_gif(frames, path, fps=DEFAULT_FPS):
+    images = (Image.fromarray(frame, 'RGBA').convert('RGB').quantize(256) for frame in frames)
+    first = next(images)
+    first.save(path, save_all=True, append_images=images, duration=int(1000 / fps), loop=0)
+
+
+def write_mp4(frames, path, fps=DEFAULT_FPS):
+    # Raw RGBA frames piped into a local ffmpeg; nothing is written to disk frame by frame
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError('MP4 output needs ffmpeg on the PATH; use a .gif output instead')
+    frames = iter(frames)
+    first = next(frames)
+    height, width = first.shape[:2]
+    command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f'{width}x{height}',
+               '-r', str(fps), '-i', '-', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p',
+               '-vcodec', 'libx264', path]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        process.stdin.write(first.tobytes())
+        for frame in frames:
+            process.stdin.write(frame.tobytes())
+    finally:
+        process.stdin.close()
+    if process.wait() != 0:
+        raise RuntimeError(f'ffmpeg failed writing {path}')
+
+
+def write_animation(frames, path, fps=DEFAULT_FPS):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path.lower().endswith('.mp4'):
+        write_mp4(frames, path, fps)
+    elif path.lower().endswith('.gif'):
+        write_gif(frames, path, fps)
+    else:
+        raise ValueError(f"animation path must end in .gif or .mp4, got '{path}'")
+    return path
+
+
+def depth_campaigns(station_data):
+    # (date, values, depths) per sampling date, each profile sorted by depth
+    campaigns = []
+    for date, data in station_data.groupby('Date'):
+        data = data.sort_values('Depths (m)')
+        campaigns.append((date, data['value'].to_numpy(), data['Depths (m)'].to_numpy()))
+    return campaigns
+
+
+def animate_depth_profile(station, df, key, output=None, fps=DEFAULT_FPS, workers=DEFAULT_WORKERS, scale=None):
+    # One frame per sampling date: the profile of that date over all samples in grey and the median profile
+    analyte = ANALYTES[key]
+    station_data = station_slices(analyte_frame(df, key), [station])[station]
+    print(f"\n--- {station} ---")
+    if station_data.empty:
+        print(f"No valid data found for {station} stations\n")
+        return None
+    campaigns = depth_campaigns(station_data)
+    scale = scale or date_scale(df['Date'])
+    colors = scale.colors(date_ns([date for date, _, _ in campaigns]))
+    median = median_profile(station_data)
+    x_pad = (station_data['value'].max() - station_data['value'].min()) * 0.05 or 1
+    y_pad = (station_data['Depths (m)'].max() - station_data['Depths (m)'].min()) * 0.05 or 0.1
+
+    def make_scene():
+        fig = new_figure(figsize=(7, 7), dpi=FRAME_DPI)
+        ax = fig.subplots()
+        ax.scatter(station_data['value'], station_data['Depths (m)'], color='lightgrey', s=30, zorder=1)
+        ax.fill_betweenx(median['Depths (m)'], median['low'], median['high'], color='grey', alpha=0.25, linewidth=0,
+                         label=f'{BOOTSTRAP_LEVEL:.0%} CI of median', zorder=1)
+        ax.plot(median['value'], median['Depths (m)'], color='black', linewidth=2, linestyle='--', label='Median',
+                zorder=2)
+        profile, = ax.plot([], [], marker='o', markersize=8, markeredgecolor='black', linewidth=2, zorder=3)
+        ax.set_xlim(station_data['value'].min() - x_pad, station_data['value'].max() + x_pad)
+        ax.set_ylim(station_data['Depths (m)'].max() + y_pad, station_data['Depths (m)'].min() - y_pad)
+        ax.set_xlabel(analyte['label'], fontsize=12, fontweight='bold')
+        ax.set_ylabel('Depth (m)', fontsize=12, fontweight='bold')
+        ax.grid(True, linestyle='--', alpha=0.7)
+        ax.legend(loc='lower right')
+        date_colorbar(fig, scale, ax=ax)
+        title = ax.set_title('', fontsize=14, fontweight='bold')
+
+        def update(i):
+            date, values, depths = campaigns[i]
+            profile.set_data(values, depths)
+            profile.set_color(colors[i])
+            title.set_text(f"{analyte['title']} at {station}: {pd.Timestamp(date):%Y-%m-%d}")
+        return fig, update, [profile, title]
+
+    output = output or f'{key}_depth_animation_{station.lower()}.gif'
+    write_animation(render_frames(len(campaigns), make_scene, workers), output, fps)
+    print(f"Animation with {len(campaigns)} campaigns saved as '{output}'")
+    return output
+
+
+def animate_nitrate_map(df, output='nitrate_station_map_animation.gif', fps=DEFAULT_FPS, workers=DEFAULT_WORKERS,
+                        size_factor=1, surface=False):
+    # The basemap is fetched once and drawn once per worker scene; per frame only the circles, the title and
+    # (with surface=True) the interpolated raster are redrawn over the saved background
+    circles = load_circle_data().dropna(subset=['lon', 'lat', 'site'])
+    x, y = to_web_mercator(circles['lon'], circles['lat'])
+    bounds = map_bounds(circles['lon'], circles['lat'])
+    table = map_campaigns(df, list(circles['site']))
+    if table.empty:
+        print('No nitrate campaigns found')
+        return None
+    sizes = np.nan_to_num(table.to_numpy(dtype=float)) * size_factor
+    colors = matplotlib.colormaps['tab20'](np.arange(len(circles)) % 20)
+    surfaces = None
+    if surface:
+        from idw_surface import cached_surfaces
+        # One KD-tree query shared by every campaign; sites missing from a campaign drop out of its weights
+        surfaces = cached_surfaces(x, y, table.to_numpy(dtype=float), bounds)
+        vmax = np.nanmax(surfaces)
+    # Tiles are downloaded here, once, before the workers start drawing
+    basemap_image(bounds)
+
+    def make_scene():
+        fig = new_figure(figsize=(12, 7), dpi=FRAME_DPI)
+        ax = fig.subplots()
+        draw_basemap(ax, bounds)
+        image = None
+        if surfaces is not None:
+            image = draw_surface(ax, surfaces[0], bounds, vmax)
+            fig.colorbar(image, ax=ax, fraction=0.03, pad=0.01, label='Nitrates (mg/L NO₃⁻)')
+        points = ax.scatter(x, y, s=sizes[0], color=colors, alpha=0.6, edgecolors=colors, linewidths=1.5, zorder=2)
+        title = ax.set_title('', fontsize=14, fontweight='bold')
+        fig.tight_layout()
+
+        def update(i):
+            points.set_sizes(sizes[i])
+            if image is not None:
+                image.set_data(np.ma.masked_invalid(surfaces[i]))
+            title.set_text(f'Nitrates in 0-2 m, {table.index[i]}')
+        return fig, update, [artist for artist in (image, points, title) if artist is not None]
+
+    write_animation(render_frames(len(table), make_scene, workers), output, fps)
+    print(f"Animation with {len(table)} campaigns saved as '{output}'")
+    return output
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Animate depth profiles or the nitrate map across campaigns')
+    parser.add_argument('kind', choices=['depth', 'map'])
+    parser.add_argument('analytes', nargs='*', metavar='analyte', help='depth: analytes to animate (default: no3)')
+    parser.add_argument('--stations', nargs='+', metavar='SS-NN', help='depth: default SS-01 to SS-16')
+    parser.add_argument('--format', choices=['gif', 'mp4'], default='gif')
+    parser.add_argument('--fps', type=float, default=DEFAULT_FPS)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--surface', action='store_true', help='map: add an IDW nitrate surface per campaign')
+    args = parser.parse_args()
+    unknown = sorted(set(args.analytes) - set(ANALYTES))
+    if unknown:
+        parser.error(f'unknown analyte(s): {", ".join(unknown)}')
+    df = load_united_compact()
+    if args.kind == 'map':
+        animate_nitrate_map(df, f'nitrate_station_map_animation.{args.format}', args.fps, args.workers,
+                            surface=args.surface)
+    else:
+        scale = date_scale(df['Date'])
+        for key in args.analytes or ['no3']:
+            for station in args.stations or [station_code(n) for n in STATION_NUMBERS]:
+                animate_depth_profile(station, df, key, f'{key}_depth_animation_{station.lower()}.{args.format}',
+                                      args.fps, args.workers, scale)
@@ -0,0 +1,202 @@
+import functools
+import importlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import matplotlib
+from matplotlib.cm import ScalarMappable
+from matplotlib.colors import Normalize
+from figure_writer import new_figure, save_figure
+from groundwater_io import ANALYTES, STATION_NUMBERS, analyte_values, station_code
+
+DATE_CMAP = 'jet'
+DATE_TICKS = 8
+DAY_NS = 86400 * 10**9
+# Bootstrap confidence band around the median profile
+BOOTSTRAP_REPLICATES = 2000
+BOOTSTRAP_LEVEL = 0.95
+BOOTSTRAP_SEED = 0
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def depth_plot_function(key):
+    # plot_station_<key>(station_code, df, output=None, dpi=None, scale=None) from the analyte's *_depth_relationship_all.py
+    module = importlib.import_module('temp_depth_relation_all' if key == 'temp' else f'{key}_depth_relationship_all')
+    return getattr(module, f'plot_station_{key}', None) or module.plot_station
+
+
+def site_codes(df):
+    # 'SS-07-EX1' -> 'SS-07'; computed once so every renderer can group instead of re-filtering.
+    # Compact and per-analyte frames carry it already as 'site'.
+    if 'site' in df.columns:
+        return df['site']
+    return df['station'].astype(str).str.extract(r'^(SS-\d+)', expand=False)
+
+
+def analyte_frame(df, key):
+    # Long-lived slice of the columns a depth profile needs: Date, Depths (m), value, site
+    frame = pd.DataFrame({'Date': df['Date'],
+                          'Depths (m)': pd.to_numeric(df['Depths (m)'], errors='coerce'),
+                          'value': analyte_values(df, key),
+                          'site': site_codes(df)})
+    return frame.dropna(subset=['value', 'Depths (m)', 'Date'])
+
+
+def site_slices(df):
+    # Rows per site. United is entered site by site, so a site's rows are usually one contiguous block and come
+    # back as an iloc view of df instead of a groupby copy; scattered sites fall back to a positional take.
+    slices = {}
+    for site, positions in df.groupby(site_codes(df), sort=False, observed=True).indices.items():
+        start, stop = positions[0], positions[-1] + 1
+        slices[site] = df.iloc[start:stop] if stop - start == len(positions) else df.iloc[positions]
+    return slices
+
+
+def station_slices(frame, stations=None):
+    stations = stations or [station_code(n) for n in STATION_NUMBERS]
+    groups = site_slices(frame)
+    return {station: groups.get(station, frame.iloc[:0]) for station in stations}
+
+
+def date_ns(dates):
+    return pd.to_datetime(pd.Series(dates)).astype('datetime64[ns]').astype(np.int64).to_numpy()
+
+
+class DateScale:
+    # One date -> colour mapping shared by every figure: an RGBA lookup table with one entry per day of the
+    # range, and colorbar ticks and labels fixed once, so a colour means the same date on every station.
+    # The colorbar runs from the first to the last sampling day, entry i being the colour of day i on it.
+    def __init__(self, start, end, cmap=DATE_CMAP, n_ticks=DATE_TICKS):
+        self.start = int(start) // DAY_NS * DAY_NS
+        self.days = int(end) // DAY_NS - self.start // DAY_NS + 1
+        self.cmap = matplotlib.colormaps[cmap]
+        self.lut = self.cmap(np.linspace(0, 1, self.days))
+        self.norm = Normalize(self.start, self.start + (self.days - 1) * DAY_NS)
+        self.ticks = np.linspace(self.norm.vmin, self.norm.vmax, n_ticks)
+        self.ticklabels = [pd.Timestamp(int(ts)).strftime('%Y-%m-%d') for ts in self.ticks]
+
+    def colors(self, ns):
+        # ns: int64 nanosecond timestamps (see date_ns) -> (n x 4) RGBA
+        return self.lut[np.clip((np.asarray(ns) - self.start) // DAY_NS, 0, self.days - 1)]
+
+
+@functools.lru_cache(maxsize=8)
+def _date_scale(start, end):
+    return DateScale(start, end)
+
+
+def date_scale(dates):
+    # Scale over the date range of dates, normally the whole dataset; built once per range and reused
+    ns = date_ns(dates)
+    ns = ns[ns != np.iinfo(np.int64).min]
+    return _date_scale(int(ns.min()), int(ns.max()))
+
+
+def date_colorbar(fig, scale, **kwargs):
+    cbar = fig.colorbar(ScalarMappable(norm=scale.norm, cmap=scale.cmap), **kwargs)
+    cbar.set_label('Date', fontsize=10, fontweight='bold')
+    cbar.set_ticks(scale.ticks)
+    cbar.set_ticklabels(scale.ticklabels)
+    return cbar
+
+
+def median_profile(station_data, replicates=BOOTSTRAP_REPLICATES, level=BOOTSTRAP_LEVEL, seed=BOOTSTRAP_SEED):
+    # Median per depth with a percentile bootstrap interval. Depths with the same number of samples are resampled
+    # together: one (depths x replicates x n) index array, medians taken along the last axis.
+    # The generator is seeded per call, so a profile's band depends only on its data.
+    rng = np.random.default_rng(seed)
+    indices = station_data.groupby('Depths (m)').indices
+    depths = np.array(list(indices), dtype=float)
+    all_values = station_data['value'].to_numpy(dtype=float)
+    values = [all_values[positions] for positions in indices.values()]
+    sizes = np.array([len(v) for v in values])
+    median, low, high = (np.empty(len(depths)) for _ in range(3))
+    tail = (1 - level) / 2 * 100
+    for n in np.unique(sizes):
+        rows = np.flatnonzero(sizes == n)
+        samples = np.stack([values[row] for row in rows])
+        index = rng.integers(0, n, size=(len(rows), replicates, n))
+        medians = np.median(np.take_along_axis(samples[:, None, :], index, axis=2), axis=2)
+        median[rows] = np.median(samples, axis=1)
+        low[rows], high[rows] = np.percentile(medians, [tail, 100 - tail], axis=1)
+    order = np.argsort(depths)
+    return pd.DataFrame({'Depths (m)': depths[order], 'value': median[order], 'low': low[order], 'high': high[order]})
+
+
+def draw_depth_profile(ax, station_data, scale, marker_size=100):
+    # Same layers as the *_depth_relationship_all.py figures: samples coloured by date,
+    # one line per sampling campaign and the dashed median profile with its bootstrap band
+    dates = date_ns(station_data['Date'])
+    colors = scale.colors(dates)
+    scatter = ax.scatter(station_data['value'], station_data['Depths (m)'], c=colors, s=marker_size, alpha=0.8,
+                         marker='o', edgecolors='black')
+    for positions in station_data.groupby(dates).indices.values():
+        data = station_data.iloc[positions].sort_values('Depths (m)')
+        ax.plot(data['value'], data['Depths (m)'], color=colors[positions[0]], linewidth=1, alpha=0.6)
+    median_data = median_profile(station_data)
+    ax.fill_betweenx(median_data['Depths (m)'], median_data['low'], median_data['high'], color='grey', alpha=0.25,
+                     linewidth=0, label=f'{BOOTSTRAP_LEVEL:.0%} CI of median')
+    ax.plot(median_data['value'], median_data['Depths (m)'], color='black', linewidth=2, linestyle='--',
+            label='Median')
+    ax.grid(True, linestyle='--', alpha=0.7)
+    return scatter
+
+
+def plot_depth_relationship(station_code, df, key, output=None, dpi=None, scale=None):
+    # The per-station figure of the *_depth_relationship_all.py scripts, drawn on a private Figure
+    # so several stations can be rendered at once from a thread pool. The date scale defaults to the
+    # range of df, which the scripts pass whole.
+    analyte = ANALYTES[key]
+    title, unit, fmt = analyte['title'], analyte['unit'], analyte.get('fmt', '.2f')
+    station_data = df[df['station'].astype(str).str.startswith(station_code)]
+    print(f"\n--- {station_code} ---")
+    print(f"Number of records: {len(station_data)}")
+
+    station_data = pd.DataFrame({'Date': station_data['Date'],
+                                 'Depths (m)': pd.to_numeric(station_data['Depths (m)'], errors='coerce'),
+                                 'value': analyte_values(station_data, key)})
+    station_data = station_data.dropna(subset=['value', 'Depths (m)'])
+    print(f"Number of valid records after removing NaN: {len(station_data)}")
+    if len(station_data) == 0:
+        print(f"No valid data found for {station_code} stations\n")
+        return None
+    scale = scale or date_scale(df['Date'])
+    fig = new_figure(figsize=(9, 8))
+    ax = fig.add_axes([0.15, 0.1, 0.7, 0.8])
+    ax_top = ax.twiny()
+    draw_depth_profile(ax, station_data, scale)
+    ax_top.set_xlim(ax.get_xlim())
+    ax_top.set_xlabel(analyte['label'], fontsize=12, fontweight='bold')
+    ax.set_ylabel('Depth (m)', fontsize=12, fontweight='bold')
+    ax.set_xlabel('')
+    ax.xaxis.set_ticks([])
+    ax.invert_yaxis()
+    ax_top.set_title(f'{title} vs Depth Relationship for {station_code} Stations', fontsize=14,
+                     fontweight='bold', pad=30)
+    date_colorbar(fig, scale, cax=fig.add_axes([0.85, 0.1, 0.03, 0.8]))
+    print(f"Plotted median {title} line for {station_code}.")
+
+    outname = save_figure(fig, output or f'{key}_depth_relationship_{station_code.lower()}.png', dpi=dpi)
+    print(f"Plot has been saved as '{outname}'")
+    print(f"Summary statistics for all {station_code} stations:")
+    print(f"Total number of measurements: {len(station_data)}")
+    print("Depth range:")
+    print(f"Min depth: {station_data['Depths (m)'].min():.2f} m")
+    print(f"Max depth: {station_data['Depths (m)'].max():.2f} m")
+    print(f"{title} range:")
+    print(f"Min {title}: {station_data['value'].min():{fmt}}{unit}")
+    print(f"Max {title}: {station_data['value'].max():{fmt}}{unit}")
+    print(f"Mean {title}: {station_data['value'].mean():{fmt}}{unit}\n")
+    return outname
+
+
+def plot_stations(df, key, stations=None, workers=DEFAULT_WORKERS, scale=None):
+    # Renders one depth figure per station; with workers > 1 the stations are drawn concurrently
+    stations = stations or [station_code(n) for n in STATION_NUMBERS]
+    plot_station = depth_plot_function(key)
+    scale = scale or date_scale(df['Date'])
+    if workers <= 1:
+        return [plot_station(station, df, scale=scale) for station in stations]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='depth-render') as pool:
+        return list(pool.map(lambda station: plot_station(station, df, scale=scale), stations))
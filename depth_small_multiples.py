@@ -0,0 +1,54 @@
+import argparse
+import math
+from depth_profiles import analyte_frame, date_colorbar, date_scale, draw_depth_profile, station_slices
+from figure_writer import flush_figures, new_figure, save_figure
+from groundwater_io import ANALYTES, load_united_compact
+
+N_COLS = 4
+
+
+def plot_analyte_grid(df, key, output=None, dpi=None, scale=None):
+    # All stations for one analyte in one figure: shared depth and value axes, one date colorbar
+    analyte = ANALYTES[key]
+    frame = analyte_frame(df, key)
+    print(f"\n--- {analyte['title']} ---")
+    if frame.empty:
+        print(f"No valid {analyte['title']} data found\n")
+        return None
+    slices = station_slices(frame)
+    scale = scale or date_scale(df['Date'])
+    n_rows = math.ceil(len(slices) / N_COLS)
+    fig = new_figure(figsize=(4 * N_COLS, 3.6 * n_rows))
+    axes = fig.subplots(n_rows, N_COLS, sharex=True, sharey=True, squeeze=False)
+    for ax, (station, station_data) in zip(axes.flat, slices.items()):
+        ax.set_title(station, fontsize=11, fontweight='bold')
+        if station_data.empty:
+            ax.text(0.5, 0.5, 'No data', transform=ax.transAxes, ha='center', va='center', color='grey')
+            continue
+        draw_depth_profile(ax, station_data, scale, marker_size=30)
+    for ax in axes.flat[len(slices):]:
+        ax.set_visible(False)
+    axes[0, 0].invert_yaxis()
+    for ax in axes[:, 0]:
+        ax.set_ylabel('Depth (m)', fontsize=10, fontweight='bold')
+    for ax in axes[-1, :]:
+        ax.set_xlabel(analyte['label'], fontsize=10, fontweight='bold')
+    date_colorbar(fig, scale, ax=axes.ravel().tolist(), fraction=0.02, pad=0.02)
+    fig.suptitle(f"{analyte['title']} vs Depth Relationship for All Stations", fontsize=14, fontweight='bold')
+    outname = save_figure(fig, output or f'{key}_depth_small_multiples.png', dpi=dpi)
+    print(f"Plot has been saved as '{outname}'")
+    return outname
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='One depth-profile figure per analyte with all stations')
+    parser.add_argument('analytes', nargs='*', metavar='analyte',
+                        help=f'analytes to plot (default: all of {", ".join(ANALYTES)})')
+    args = parser.parse_args()
+    unknown = sorted(set(args.analytes) - set(ANALYTES))
+    if unknown:
+        parser.error(f'unknown analyte(s): {", ".join(unknown)}')
+    df = load_united_compact()
+    for key in args.analytes or ANALYTES:
+        plot_analyte_grid(df, key)
+    flush_figures()
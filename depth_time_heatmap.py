@@ -0,0 +1,142 @@
+import argparse
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from matplotlib.dates import DateFormatter, date2num
+from figure_writer import flush_figures, new_figure, save_figure
+from groundwater_io import (ANALYTES, STATION_NUMBERS, analyte_values, load_united_compact,
+                            logger_depth_m, station_code)
+from logger_store import iter_loggers_mmap
+
+CACHE_DIR = 'heatmap_cache'
+N_TIME = 400
+N_DEPTH = 60
+
+
+def united_matrix(df, station, key):
+    # Campaign date x sample depth matrix of one analyte for all sensors of a station
+    station_data = df[df['station'].str.startswith(station)]
+    frame = pd.DataFrame({'Date': station_data['Date'],
+                          'depth': pd.to_numeric(station_data['Depths (m)'], errors='coerce'),
+                          'value': analyte_values(station_data, key)}).dropna()
+    return frame.pivot_table(index='Date', columns='depth', values='value', aggfunc='median')
+
+
+def logger_matrix(logger):
+    # Reading time x sensor depth matrix of a station's N.csv water content
+    matrix = logger.set_index('Time').apply(pd.to_numeric, errors='coerce')
+    matrix.columns = [logger_depth_m(header, i) for i, header in enumerate(matrix.columns)]
+    matrix = matrix[~matrix.index.duplicated()].sort_index()
+    if matrix.columns.duplicated().any():
+        matrix = matrix.T.groupby(level=0).mean().T
+    return matrix.sort_index(axis=1)
+
+
+def _interp_rows(matrix, grid):
+    # Linear interpolation of every column at once along the index; no extrapolation past the data
+    filled = matrix.reindex(matrix.index.union(grid)).interpolate(method='index', limit_area='inside')
+    return filled.reindex(grid)
+
+
+def regular_grid(matrix, n_time=N_TIME, n_depth=N_DEPTH):
+    matrix = matrix.dropna(how='all').dropna(axis=1, how='all')
+    if matrix.shape[0] < 2 or matrix.shape[1] < 2:
+        return None
+    times = pd.date_range(matrix.index.min(), matrix.index.max(), periods=n_time)
+    depths = np.linspace(matrix.columns.min(), matrix.columns.max(), n_depth)
+    if len(matrix) > n_time:
+        # Denser than the grid (logger data): average the readings falling in each time cell
+        step = times[1] - times[0]
+        cells = np.clip(np.rint((matrix.index - times[0]) / step).astype(int), 0, n_time - 1)
+        matrix = matrix.groupby(cells).mean()
+        matrix.index = times[matrix.index]
+    on_times = _interp_rows(matrix, times)
+    on_depths = _interp_rows(on_times.T, pd.Index(depths))
+    return times.to_numpy(), depths, on_depths.to_numpy(dtype=float)
+
+
+def _cache_key(matrix, n_time, n_depth):
+    digest = hashlib.sha1()
+    digest.update(pd.util.hash_pandas_object(matrix, index=True).to_numpy().tobytes())
+    digest.update(np.asarray(matrix.columns, dtype=float).tobytes())
+    digest.update(f'{n_time}x{n_depth}'.encode())
+    return digest.hexdigest()[:16]
+
+
+def cached_grid(matrix, name, n_time=N_TIME, n_depth=N_DEPTH, cache_dir=CACHE_DIR):
+    stem = os.path.join(cache_dir, f'{name}_{_cache_key(matrix, n_time, n_depth)}')
+    if os.path.exists(f'{stem}_values.npy'):
+        return np.load(f'{stem}_times.npy'), np.load(f'{stem}_depths.npy'), np.load(f'{stem}_values.npy')
+    grid = regular_grid(matrix, n_time, n_depth)
+    if grid is None:
+        return None
+    os.makedirs(cache_dir, exist_ok=True)
+    # Each part goes through a temporary file and a rename, and values, whose presence marks the entry
+    # as complete, comes last, so an interrupted run never leaves a truncated or partial entry
+    for part, array in zip(['times', 'depths', 'values'], grid):
+        path = f'{stem}_{part}.npy'
+        with open(f'{path}.tmp', 'wb') as f:
+            np.save(f, array)
+        os.replace(f'{path}.tmp', path)
+    return grid
+
+
+def plot_heatmap(grid, title, label, outname, cmap='jet'):
+    times, depths, values = grid
+    fig = new_figure(figsize=(12, 6))
+    ax = fig.subplots()
+    mesh = ax.pcolormesh(date2num(times), depths, np.ma.masked_invalid(values),
+                         shading='nearest', cmap=cmap)
+    ax.xaxis_date()
+    ax.xaxis.set_major_formatter(DateFormatter('%m/%Y'))
+    ax.invert_yaxis()
+    ax.set_ylabel('Depth (m)', fontsize=12, fontweight='bold')
+    ax.set_xlabel('Date', fontsize=12, fontweight='bold')
+    ax.tick_params(axis='x', labelrotation=30)
+    cbar = fig.colorbar(mesh, ax=ax)
+    cbar.set_label(label, fontsize=10, fontweight='bold')
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    save_figure(fig, outname)
+    print(f"Plot has been saved as '{outname}'")
+
+
+def plot_united_heatmaps(df, key):
+    analyte = ANALYTES[key]
+    for station_num in STATION_NUMBERS:
+        station = station_code(station_num)
+        grid = cached_grid(united_matrix(df, station, key), f'{key}_{station.lower()}')
+        if grid is None:
+            print(f'Not enough {analyte["title"]} data to grid {station}')
+            continue
+        plot_heatmap(grid, f'{analyte["title"]} Depth-Time Section for {station} Stations', analyte['label'],
+                     f'{key}_depth_time_heatmap_{station.lower()}.png')
+
+
+def plot_logger_heatmaps():
+    os.makedirs('station_plots_heatmap', exist_ok=True)
+    for station_num, logger in iter_loggers_mmap():
+        grid = cached_grid(logger_matrix(logger), f'water_content_station_{station_num}')
+        if grid is None:
+            print(f'Not enough water content data to grid Station {station_num}')
+            continue
+        plot_heatmap(grid, f'Water Content Depth-Time Section for Station {station_num}', 'Water Content (%)',
+                     f'station_plots_heatmap/station_{station_num}_water_content_heatmap.png', cmap='viridis_r')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Depth x time heatmaps on a cached regular grid')
+    parser.add_argument('source', choices=['united', 'logger'])
+    parser.add_argument('analytes', nargs='*', metavar='analyte',
+                        help=f'United analytes to plot (default: all of {", ".join(ANALYTES)})')
+    args = parser.parse_args()
+    unknown = sorted(set(args.analytes) - set(ANALYTES))
+    if unknown:
+        parser.error(f'unknown analyte(s): {", ".join(unknown)}')
+    if args.source == 'logger':
+        plot_logger_heatmaps()
+    else:
+        df = load_united_compact()
+        for key in args.analytes or ANALYTES:
+            plot_united_heatmaps(df, key)
+    flush_figures()
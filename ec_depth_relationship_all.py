@@ -1,83 +1,17 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
-from datetime import datetime
+from matplotlib import style
+from depth_profiles import date_scale, plot_depth_relationship
+from figure_writer import flush_figures
+from groundwater_io import load_united_compact
 
-plt.style.use('default')
+style.use('default')
 
-def plot_station(station_code, df):
-    station_data = df[df['station'].str.startswith(station_code)].copy()
-    print(f"\n--- {station_code} ---")
-    print(f"Number of records: {len(station_data)}")
-    station_data['EC (μS/cm)'] = pd.to_numeric(station_data['EC (μS/cm)'], errors='coerce')
-    station_data['Depths (m)'] = pd.to_numeric(station_data['Depths (m)'], errors='coerce')
-    station_data = station_data.dropna(subset=['EC (μS/cm)', 'Depths (m)'])
-    print(f"Number of valid records after removing NaN: {len(station_data)}")
-    if len(station_data) == 0:
-        print(f"No valid data found for {station_code} stations\n")
-        return
-    fig = plt.figure(figsize=(9, 8))
-    ax = fig.add_axes([0.15, 0.1, 0.7, 0.8])
-    ax_top = ax.twiny()
-    scatter = ax.scatter(station_data['EC (μS/cm)'], 
-                        station_data['Depths (m)'],
-                        c=station_data['Date'].astype(np.int64),
-                        cmap='jet',
-                        s=100,
-                        alpha=0.8,
-                        marker='o',
-                        edgecolors='black')
-    ax_top.set_xlim(ax.get_xlim())
-    ax_top.set_xlabel('EC (μS/cm)', fontsize=12, fontweight='bold')
-    ax.set_ylabel('Depth (m)', fontsize=12, fontweight='bold')
-    ax.set_xlabel('')
-    ax.xaxis.set_ticks([])
-    ax.invert_yaxis()
-    plt.title(f'EC vs Depth Relationship for {station_code} Stations', 
-             fontsize=14, 
-             fontweight='bold',
-             pad=30)
-    cax = fig.add_axes([0.85, 0.1, 0.03, 0.8])
-    cbar = plt.colorbar(scatter, cax=cax)
-    cbar.set_label('Date', fontsize=10, fontweight='bold')
-    tick_locations = np.linspace(station_data['Date'].astype(np.int64).min(),
-                               station_data['Date'].astype(np.int64).max(),
-                               8)
-    cbar.set_ticks(tick_locations)
-    cbar.set_ticklabels([pd.Timestamp(ts).strftime('%Y-%m-%d') 
-                        for ts in tick_locations])
-    ax.grid(True, linestyle='--', alpha=0.7)
-    
-    unique_dates = station_data['Date'].unique()
-    norm = plt.Normalize(station_data['Date'].astype(np.int64).min(), station_data['Date'].astype(np.int64).max())
-    cmap = plt.get_cmap('jet')
-    for date in unique_dates:
-        data = station_data[station_data['Date'] == date].sort_values('Depths (m)')
-        color = cmap(norm(pd.to_datetime(date).to_datetime64().astype(np.int64)))
-        ax.plot(data['EC (μS/cm)'], data['Depths (m)'], color=color, linewidth=1, alpha=0.6)
-
-    median_data = station_data.groupby('Depths (m)', as_index=False)['EC (μS/cm)'].median().sort_values('Depths (m)')
-    ax.plot(median_data['EC (μS/cm)'], median_data['Depths (m)'], color='black', linewidth=2, linestyle='--', label='Median')
-    print(f"Plotted median EC line for {station_code}.")
-    outname = f'ec_depth_relationship_{station_code.lower()}.png'
-    plt.savefig(outname, dpi=300, bbox_inches='tight')
-    plt.close()
-    print(f"Plot has been saved as '{outname}'")
-    print(f"Summary statistics for all {station_code} stations:")
-    print(f"Total number of measurements: {len(station_data)}")
-    print("Depth range:")
-    print(f"Min depth: {station_data['Depths (m)'].min():.2f} m")
-    print(f"Max depth: {station_data['Depths (m)'].max():.2f} m")
-    print("EC range:")
-    print(f"Min EC: {station_data['EC (μS/cm)'].min():.0f} μS/cm")
-    print(f"Max EC: {station_data['EC (μS/cm)'].max():.0f} μS/cm")
-    print(f"Mean EC: {station_data['EC (μS/cm)'].mean():.0f} μS/cm\n")
+def plot_station(station_code, df, output=None, dpi=None, scale=None):
+    return plot_depth_relationship(station_code, df, 'ec', output=output, dpi=dpi, scale=scale)
 
 if __name__ == '__main__':
-    df = pd.read_excel('United.xlsx')  
-    df.columns = df.iloc[0]
-    df = df.iloc[1:].reset_index(drop=True)
-    df['Date'] = pd.to_datetime(df['Date'])
+    df = load_united_compact()
+    scale = date_scale(df['Date'])
     for i in range(1, 17):
         station_code = f'SS-{i:02d}'
-        plot_station(station_code, df) 
\ No newline at end of file
+        plot_station(station_code, df, scale=scale)
+    flush_figures()
@@ -0,0 +1,170 @@
+import atexit
+import io
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+import report_sink
+from output_profiles import RASTER_FORMATS, active_profile, output_path, rasterize_dense_layers
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+# Rendered canvases waiting to be encoded; each 300 dpi figure is ~30 MB of RGBA
+DEFAULT_MAX_PENDING = 8
+PAD_INCHES = 0.1
+
+
+def new_figure(**kwargs):
+    # A Figure with its own Agg canvas and no pyplot registration: nothing global is touched while
+    # drawing, so separate figures can be built and saved on separate threads
+    fig = Figure(**kwargs)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def render_rgba(fig, dpi, tight=True):
+    # Draws the figure once at the output dpi, cropped to its tight bounding box as savefig(bbox_inches='tight')
+    # would. The box comes from a layout pass without rasterising, the same one savefig uses.
+    # The figure's own dpi and canvas are put back afterwards, so a pyplot window still shows it at screen size.
+    original_dpi, original_canvas = fig.dpi, fig.canvas
+    try:
+        return _render_rgba(fig, dpi, tight)
+    finally:
+        fig.set_canvas(original_canvas)
+        fig.set_dpi(original_dpi)
+
+
+def _render_rgba(fig, dpi, tight):
+    fig.set_dpi(dpi)
+    canvas = fig.canvas if isinstance(fig.canvas, FigureCanvasAgg) else FigureCanvasAgg(fig)
+    if not tight:
+        canvas.draw()
+        return np.asarray(canvas.buffer_rgba()).copy()
+    fig.draw_without_rendering()
+    bbox = fig.get_tightbbox(canvas.get_renderer()).padded(PAD_INCHES)
+    width, height = canvas.get_width_height()
+    x0, x1 = math.floor(bbox.x0 * dpi), math.ceil(bbox.x1 * dpi)
+    y0, y1 = math.floor(bbox.y0 * dpi), math.ceil(bbox.y1 * dpi)
+    if x0 >= 0 and y0 >= 0 and x1 <= width and y1 <= height:
+        canvas.draw()
+        rgba = np.asarray(canvas.buffer_rgba())
+        return rgba[height - y1:height - y0, x0:x1].copy()
+    # Content past the canvas edge (twin-axis labels, padded titles): let savefig grow the canvas to the box
+    # and render straight into an in-memory RGBA buffer
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='rgba', dpi=dpi, bbox_inches=bbox)
+    data = buffer.getvalue()
+    box_width = int(bbox.width * dpi)
+    return np.frombuffer(data, dtype=np.uint8).reshape(len(data) // (4 * box_width), box_width, 4)
+
+
+def encode_image(rgba, target, dpi, format='png', pil_kwargs=None):
+    options = dict(pil_kwargs or {})
+    if format == 'png':
+        options.setdefault('dpi', (dpi, dpi))
+    Image.fromarray(rgba, 'RGBA').save(target, format=format, **options)
+
+
+def write_image(rgba, path, dpi, format='png', pil_kwargs=None):
+    # Encodes into a temporary file next to the target and renames it, so readers never see a partial image
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    try:
+        encode_image(rgba, tmp_path, dpi, format, pil_kwargs)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class AsyncFigureWriter:
+    # Drawing stays on the calling thread; PNG/WebP compression and file writes run in a thread pool.
+    # submit() blocks once max_pending canvases are waiting, which bounds memory use.
+    def __init__(self, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='png-writer')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._futures = []
+
+    def submit(self, fig, path, dpi=300, tight=True, format='png', pil_kwargs=None):
+        rgba = render_rgba(fig, dpi, tight)
+        return self.run(write_image, rgba, os.fspath(path), dpi, format, pil_kwargs)
+
+    def run(self, fn, *args):
+        # Queues any encode/write task behind the same backpressure and error reporting
+        self._slots.acquire()
+        future = self._pool.submit(fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self._futures = [f for f in self._futures if not f.done() or f.exception() is not None]
+            self._futures.append(future)
+        return future
+
+    def flush(self):
+        # Waits for every queued write and re-raises the first failure
+        with self._lock:
+            futures, self._futures = self._futures, []
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._pool.shutdown(wait=True)
+
+
+_default_writer = None
+_default_lock = threading.Lock()
+
+
+def default_writer():
+    global _default_writer
+    with _default_lock:
+        if _default_writer is None:
+            _default_writer = AsyncFigureWriter()
+            atexit.register(_default_writer.close)
+        return _default_writer
+
+
+def flush_figures():
+    # Waits for the writes save_figure queued in the background and re-raises the first failure. Entry points
+    # call it before exiting so a failed write fails the run; the atexit close only cleans up the pool.
+    with _default_lock:
+        writer = _default_writer
+    if writer is not None:
+        writer.flush()
+
+
+def save_figure(fig, output, dpi=None, tight=True, close=True):
+    # Writes in the active output profile: raster formats go through the background writer,
+    # vector formats are saved inline with dense layers rasterised. File objects always get PNG.
+    # While a report is open (GROUNDWATER_REPORT) named figures go into it instead of separate files.
+    profile = active_profile()
+    dpi = dpi or profile['dpi']
+    bbox_inches = 'tight' if tight and profile['tight'] else None
+    report = report_sink.active_report()
+    if report is not None and isinstance(output, (str, os.PathLike)):
+        output = report.add(fig, output_path(output, profile), dpi, bbox_inches is not None, profile)
+    elif not isinstance(output, (str, os.PathLike)):
+        fig.savefig(output, format='png', dpi=dpi, bbox_inches=bbox_inches)
+    else:
+        output = output_path(output, profile)
+        if profile['format'] in RASTER_FORMATS:
+            default_writer().submit(fig, output, dpi, bbox_inches is not None, profile['format'],
+                                    profile['pil_kwargs'])
+        else:
+            if profile.get('rasterize'):
+                rasterize_dense_layers(fig)
+            fig.savefig(output, format=profile['format'], dpi=dpi, bbox_inches=bbox_inches)
+    if close and fig.canvas.manager is not None:
+        # Only figures created through pyplot have a manager; pyplot is not loaded for the others
+        import matplotlib.pyplot as plt
+        plt.close(fig)
+    return output
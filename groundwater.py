@@ -0,0 +1,189 @@
+import argparse
+import os
+import runpy
+import sys
+from output_profiles import PROFILES
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Only the standard library is imported up front; pandas, matplotlib and the plotting scripts
+# are imported inside the subcommand that needs them, so --help and argument errors are instant.
+# Same keys as groundwater_io.ANALYTES, which cannot be imported here without pulling in pandas.
+ANALYTE_KEYS = ['ph', 'temp', 'do', 'ec', 'lab_conductivity', 'lab_ph', 'ca', 'mg', 'na', 'k', 'total_alk',
+                'cl', 'so4', 'no3', 'ionic_balance', 'br', 'no2', 'hpo4', 'f']
+
+
+def setup_matplotlib(args):
+    # Non-interactive backend, fonts resolved once per process, then the run-wide output settings
+    os.environ['MPLBACKEND'] = 'Agg'
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import font_manager
+    font_manager.findfont(font_manager.FontProperties())
+    from output_profiles import set_output_profile
+    if args.profile:
+        set_output_profile(args.profile)
+    if args.report:
+        from report_sink import open_report
+        open_report(args.report)
+
+
+def run_depth(args):
+    setup_matplotlib(args)
+    from groundwater_io import STATION_NUMBERS, load_united_compact, station_code
+    keys = args.analytes or ANALYTE_KEYS
+    stations = args.stations or [station_code(n) for n in STATION_NUMBERS]
+    df = load_united_compact()
+    if args.qa:
+        from qa_flags import apply_flags, united_flags
+        df = apply_flags(df, united_flags(df), keys)
+    from depth_profiles import date_scale
+    # One date colour scale for every figure of the run
+    scale = date_scale(df['Date'])
+    if args.mode == 'profiles':
+        from depth_profiles import plot_stations
+        for key in keys:
+            plot_stations(df, key, stations, workers=args.workers, scale=scale)
+    elif args.mode == 'small-multiples':
+        from depth_small_multiples import plot_analyte_grid
+        for key in keys:
+            plot_analyte_grid(df, key, scale=scale)
+    elif args.mode == 'panels':
+        from depth_profiles import site_slices
+        from station_panels import plot_station_panels
+        slices = site_slices(df)
+        for station in stations:
+            if station in slices:
+                plot_station_panels(slices[station], station, keys, scale=scale)
+    elif args.mode == 'animation':
+        from animations import animate_depth_profile
+        for key in keys:
+            for station in stations:
+                animate_depth_profile(station, df, key, workers=args.workers, scale=scale)
+    else:
+        from depth_time_heatmap import plot_united_heatmaps
+        for key in keys:
+            plot_united_heatmaps(df, key)
+
+
+def run_dual_axis(args):
+    setup_matplotlib(args)
+    for analyte in args.analytes or ['nitrate', 'nitrite']:
+        runpy.run_module(f'{analyte}_precip_dual_axis', run_name='__main__')
+
+
+def run_water_content(args):
+    setup_matplotlib(args)
+    if args.mode == 'heatmap':
+        from depth_time_heatmap import plot_logger_heatmaps
+        plot_logger_heatmaps()
+    else:
+        runpy.run_module('water_content_precip_dual_axis', run_name='__main__')
+
+
+def run_script(module):
+    def run(args):
+        setup_matplotlib(args)
+        runpy.run_module(module, run_name='__main__')
+    return run
+
+
+def run_map(args):
+    setup_matplotlib(args)
+    if args.animate:
+        from animations import animate_nitrate_map
+        from groundwater_io import load_united_compact
+        animate_nitrate_map(load_united_compact(), surface=args.surface)
+    else:
+        from nitrate_station_map import main
+        main(campaigns=args.campaigns, surface=args.surface)
+
+
+def run_jobs(args):
+    setup_matplotlib(args)
+    from plot_pipeline import DEFAULT_WORKERS, Pipeline, load_spec
+    spec = load_spec(args.spec)
+    failed = Pipeline(workers=args.workers or spec.get('workers', DEFAULT_WORKERS)).run(spec['jobs'])
+    return 1 if failed else 0
+
+
+def run_watch(args):
+    setup_matplotlib(args)
+    from plot_watch import Watcher
+    watcher = Watcher(args.kinds, args.analytes, args.workers or DEFAULT_WORKERS)
+    try:
+        return 1 if watcher.run(once=args.once) else 0
+    except KeyboardInterrupt:
+        print('Stopped watching')
+        return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='groundwater', description='Groundwater analysis plots')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--profile', choices=list(PROFILES),
+                        help='output profile (default: $GROUNDWATER_OUTPUT_PROFILE or default)')
+    common.add_argument('--report', metavar='PATH', help='write every figure into one .pdf or .zip')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    depth = commands.add_parser('depth', parents=[common], help='depth profiles of United analytes')
+    depth.add_argument('analytes', nargs='*', metavar='analyte', help=f'default: all of {", ".join(ANALYTE_KEYS)}')
+    depth.add_argument('--stations', nargs='+', metavar='SS-NN', help='default: SS-01 to SS-16')
+    depth.add_argument('--mode', choices=['profiles', 'small-multiples', 'panels', 'heatmap', 'animation'],
+                       default='profiles')
+    depth.add_argument('--qa', action='store_true', help='leave out samples flagged by qa_flags.py')
+    depth.add_argument('--workers', type=int, default=1, help='stations (or animation frames) rendered in parallel')
+    depth.set_defaults(run=run_depth)
+
+    dual_axis = commands.add_parser('dual-axis', parents=[common], help='nitrate/nitrite vs precipitation')
+    dual_axis.add_argument('analytes', nargs='*', metavar='analyte', help='nitrate, nitrite (default: both)')
+    dual_axis.set_defaults(run=run_dual_axis)
+
+    water_content = commands.add_parser('water-content', parents=[common], help='logger water content')
+    water_content.add_argument('--mode', choices=['lines', 'heatmap'], default='lines')
+    water_content.set_defaults(run=run_water_content)
+
+    temperature = commands.add_parser('temperature', parents=[common], help='daily mean air temperature')
+    temperature.set_defaults(run=run_script('plot_temperature_all_stations'))
+
+    station_map = commands.add_parser('map', parents=[common], help='nitrate station map')
+    station_map.add_argument('--campaigns', action='store_true', help='one point per station and monthly campaign')
+    station_map.add_argument('--surface', action='store_true', help='add an IDW nitrate surface layer')
+    station_map.add_argument('--animate', action='store_true', help='one frame per monthly nitrate campaign (GIF)')
+    station_map.set_defaults(run=run_map)
+
+    jobs = commands.add_parser('jobs', parents=[common], help='run the plot jobs in a YAML/TOML spec')
+    jobs.add_argument('spec', help='job spec (.yaml, .yml or .toml)')
+    jobs.add_argument('--workers', type=int, help='parallel builds and renders')
+    jobs.set_defaults(run=run_jobs)
+
+    watch = commands.add_parser('watch', parents=[common], help='re-render figures when input files change')
+    watch.add_argument('analytes', nargs='*', metavar='analyte', help='analytes for depth figures (default: all)')
+    watch.add_argument('--kinds', nargs='+', default=['depth', 'nitrate', 'nitrite', 'water-content'],
+                       choices=['depth', 'panels', 'small-multiples', 'heatmap', 'nitrate', 'nitrite', 'water-content'])
+    watch.add_argument('--workers', type=int, help='parallel builds and renders')
+    watch.add_argument('--once', action='store_true', help='process pending changes and exit')
+    watch.set_defaults(run=run_watch)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    unknown = []
+    if args.command in ('depth', 'watch'):
+        unknown = sorted(set(args.analytes) - set(ANALYTE_KEYS))
+    elif args.command == 'dual-axis':
+        unknown = sorted(set(args.analytes) - {'nitrate', 'nitrite'})
+    if unknown:
+        parser.error(f'unknown analyte(s): {", ".join(unknown)}')
+    status = args.run(args)
+    # Background PNG writes fail the command here rather than at interpreter exit; commands that saved
+    # nothing never imported the writer
+    if 'figure_writer' in sys.modules:
+        sys.modules['figure_writer'].flush_figures()
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
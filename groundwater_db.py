@@ -0,0 +1,161 @@
+import datetime
+import os
+import sqlite3
+from contextlib import closing
+import pandas as pd
+from groundwater_io import (ANALYTES, load_precip, load_united, logger_depth_m, logger_sensor_id,
+                            normalise_united, station_code)
+from logger_store import iter_loggers_mmap
+
+DB_FILE = 'groundwater.sqlite'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+CLIMATE_SITE = 'climate'
+
+SCHEMA = """
+CREATE TABLE measurements (
+    source TEXT NOT NULL,      -- 'lab', 'logger' or 'climate'
+    site TEXT,                 -- e.g. 'SS-07'
+    sensor TEXT,               -- e.g. 'EX1', 'S03'
+    station TEXT,              -- full United station code for lab samples
+    date TEXT NOT NULL,        -- 'YYYY-MM-DD HH:MM:SS', sorts chronologically
+    depth_m REAL,
+    analyte TEXT NOT NULL,     -- registry name ('NO3', 'pH', ...), 'water_content' or a climate column
+    value REAL NOT NULL,
+    censored INTEGER NOT NULL DEFAULT 0
+)
+"""
+MEASUREMENT_COLUMNS = ['source', 'site', 'sensor', 'station', 'date', 'depth_m', 'analyte', 'value', 'censored']
+INDEXES = [
+    'CREATE INDEX idx_site_sensor_date ON measurements (site, sensor, date)',
+    'CREATE INDEX idx_analyte_date ON measurements (analyte, date)',
+]
+
+
+def _lab_rows(united):
+    normalised = normalise_united(united).dropna(subset=['Date'])
+    names = [a['name'] for a in ANALYTES.values()]
+    ids = ['site', 'sensor', 'station', 'Date', 'Depths (m)']
+    rows = normalised.melt(id_vars=ids, value_vars=names, var_name='analyte', value_name='value')
+    # Both melts walk the columns in the same order, so the flags line up with the values
+    flags = normalised.melt(value_vars=[f'{name}_censored' for name in names], value_name='censored')
+    rows['censored'] = flags['censored'].to_numpy().astype(int)
+    rows = rows.dropna(subset=['value']).rename(columns={'Date': 'date', 'Depths (m)': 'depth_m'})
+    rows['date'] = rows['date'].dt.strftime(DATE_FORMAT)
+    rows['source'] = 'lab'
+    return rows
+
+
+def _logger_rows(station_num, logger):
+    for position, header in enumerate(logger.columns[1:]):
+        rows = pd.DataFrame({'date': logger['Time'], 'value': logger[header]}).dropna()
+        rows['date'] = rows['date'].dt.strftime(DATE_FORMAT)
+        rows['source'] = 'logger'
+        rows['site'] = station_code(station_num)
+        rows['sensor'] = logger_sensor_id(position)
+        rows['depth_m'] = logger_depth_m(header, position)
+        rows['analyte'] = 'water_content'
+        yield rows
+
+
+def _climate_rows(precip):
+    values = precip.drop(columns='Date & Time [UTC]').apply(pd.to_numeric, errors='coerce')
+    values['date'] = precip['Date & Time [UTC]'].dt.strftime(DATE_FORMAT)
+    rows = values.melt(id_vars='date', var_name='analyte', value_name='value').dropna(subset=['value'])
+    rows['source'] = 'climate'
+    rows['site'] = CLIMATE_SITE
+    return rows
+
+
+def build_database(united, loggers, precip, db_path=DB_FILE):
+    # Rebuilds into a temporary file and swaps it in, so readers never see a half-built store
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    with closing(sqlite3.connect(tmp_path)) as conn:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute(SCHEMA)
+        count = 0
+        batches = [_lab_rows(united), _climate_rows(precip)]
+        for batch in batches:
+            batch.to_sql('measurements', conn, if_exists='append', index=False, chunksize=50000)
+            count += len(batch)
+        for station_num, logger in loggers:
+            for batch in _logger_rows(station_num, logger):
+                batch.to_sql('measurements', conn, if_exists='append', index=False, chunksize=50000)
+                count += len(batch)
+        for statement in INDEXES:
+            conn.execute(statement)
+        conn.execute('ANALYZE')
+        conn.commit()
+    os.replace(tmp_path, db_path)
+    print(f"Stored {count} measurements in '{db_path}'")
+    return count
+
+
+def connect(db_path=DB_FILE):
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"'{db_path}' not found, run groundwater_db.py to build it")
+    return sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+
+
+def query(sql, params=(), db_path=DB_FILE):
+    with closing(connect(db_path)) as conn:
+        df = pd.read_sql_query(sql, conn, params=params)
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def _select_list(columns):
+    # '*', 'date, value' or ['date', 'value']; only measurement table columns, quoted, reach the SQL
+    if columns == '*':
+        return '*'
+    names = [name.strip() for name in columns.split(',')] if isinstance(columns, str) else list(columns)
+    unknown = [name for name in names if name not in MEASUREMENT_COLUMNS]
+    if unknown or not names:
+        raise ValueError(f"columns must be '*' or among {', '.join(MEASUREMENT_COLUMNS)}, got {columns!r}")
+    return ', '.join(f'"{name}"' for name in names)
+
+
+def _is_bare_date(value):
+    if isinstance(value, str):
+        return ':' not in value
+    return isinstance(value, datetime.date) and not isinstance(value, datetime.datetime)
+
+
+def measurements(analyte=None, site=None, sensor=None, start=None, end=None, min_depth=None, max_depth=None,
+                 source=None, columns='*', db_path=DB_FILE):
+    # e.g. measurements('NO3', site='SS-07', min_depth=1.5, start='2024-01-01')['value'].max()
+    # An end given as a bare date includes the whole of that day
+    select = _select_list(columns)
+    clauses, params = [], []
+    for column, value in [('analyte', analyte), ('site', site), ('sensor', sensor), ('source', source)]:
+        if value is not None:
+            clauses.append(f'{column} = ?')
+            params.append(value)
+    if start is not None:
+        clauses.append('date >= ?')
+        params.append(pd.Timestamp(start).strftime(DATE_FORMAT))
+    if end is not None and _is_bare_date(end):
+        clauses.append('date < ?')
+        params.append((pd.Timestamp(end) + pd.Timedelta(days=1)).strftime(DATE_FORMAT))
+    elif end is not None:
+        clauses.append('date <= ?')
+        params.append(pd.Timestamp(end).strftime(DATE_FORMAT))
+    if min_depth is not None:
+        clauses.append('depth_m >= ?')
+        params.append(float(min_depth))
+    if max_depth is not None:
+        clauses.append('depth_m <= ?')
+        params.append(float(max_depth))
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+    return query(f'SELECT {select} FROM measurements{where} ORDER BY date', params, db_path)
+
+
+if __name__ == '__main__':
+    print('Loading data...')
+    united = load_united()
+    precip = load_precip()
+    print('Data loaded.')
+    build_database(united, iter_loggers_mmap(), precip)
@@ -0,0 +1,262 @@
+import hashlib
+import os
+import re
+import pandas as pd
+
+UNITED_FILE = 'United.xlsx'
+PRECIP_FILE = 'UZM_Precipitation_Combined-Climate data.xlsx'
+LOGGER_TIME_FORMAT = '%d/%m/%Y %H:%M'
+STATION_NUMBERS = range(1, 17)
+# Workbooks above this size are streamed row by row (openpyxl read-only) instead of parsed whole by read_excel
+STREAM_MIN_BYTES = 20 * 1024 * 1024
+BATCH_ROWS = 10000
+
+# Analytes plotted by the *_depth_relationship_all.py scripts, keyed by their output prefix.
+# 'column' is the United column position (or header), 'name' the column the scripts plot.
+ANALYTES = {
+    'ph': {'column': 8, 'name': 'pH', 'title': 'pH', 'label': 'pH', 'unit': ''},
+    'temp': {'column': 9, 'name': 'Temperature', 'title': 'Temperature', 'label': 'Temperature', 'unit': ''},
+    'do': {'column': 10, 'name': 'DO (mg/L)', 'title': 'DO (mg/L)', 'label': 'DO (mg/L)', 'unit': ''},
+    'ec': {'column': 'EC (μS/cm)', 'name': 'EC (μS/cm)', 'title': 'EC', 'label': 'EC (μS/cm)', 'unit': ' μS/cm', 'fmt': '.0f'},
+    'lab_conductivity': {'column': 36, 'name': 'Lab_Conductivity', 'title': 'Lab Conductivity', 'label': 'Lab Conductivity (µS/cm)', 'unit': ' µS/cm'},
+    'lab_ph': {'column': 37, 'name': 'Lab_pH', 'title': 'Lab pH', 'label': 'Lab pH', 'unit': ''},
+    'ca': {'column': 38, 'name': 'Ca', 'title': 'Ca', 'label': 'Ca (mg/L)', 'unit': ' mg/L'},
+    'mg': {'column': 39, 'name': 'Mg', 'title': 'Mg', 'label': 'Mg (mg/L)', 'unit': ' mg/L'},
+    'na': {'column': 40, 'name': 'Na', 'title': 'Na', 'label': 'Na (mg/L)', 'unit': ' mg/L'},
+    'k': {'column': 41, 'name': 'K', 'title': 'K', 'label': 'K (mg/L)', 'unit': ' mg/L'},
+    'total_alk': {'column': 42, 'name': 'Total_Alk', 'title': 'Total Alkalinity', 'label': 'Total Alkalinity (mg/L)', 'unit': ' mg/L'},
+    'cl': {'column': 43, 'name': 'Cl', 'title': 'Cl⁻', 'label': 'Cl⁻ (mg/L)', 'unit': ' mg/L'},
+    'so4': {'column': 44, 'name': 'SO4', 'title': 'SO₄²⁻', 'label': 'SO₄²⁻ (mg/L)', 'unit': ' mg/L'},
+    'no3': {'column': 45, 'name': 'NO3', 'title': 'NO₃⁻', 'label': 'NO₃⁻ (mg/L)', 'unit': ' mg/L'},
+    'ionic_balance': {'column': 46, 'name': 'Ionic_Balance', 'title': 'Ionic Balance', 'label': 'Ionic Balance (%)', 'unit': ' %'},
+    'br': {'column': 47, 'name': 'Br', 'title': 'Br⁻', 'label': 'Br⁻ (mg/L)', 'unit': ' mg/L'},
+    'no2': {'column': 48, 'name': 'NO2', 'title': 'NO₂⁻', 'label': 'NO₂⁻ (mg/L)', 'unit': ' mg/L'},
+    'hpo4': {'column': 49, 'name': 'HPO4', 'title': 'HPO₄²⁻', 'label': 'HPO₄²⁻ (mg/L)', 'unit': ' mg/L'},
+    'f': {'column': 50, 'name': 'F', 'title': 'F⁻', 'label': 'F⁻ (mg/L)', 'unit': ' mg/L'},
+}
+
+# Censored lab columns drawn against precipitation by the *_precip_dual_axis.py scripts
+DUAL_AXIS_COLUMNS = {'nitrate': 'Nitrates (mg/L NO₃⁻)', 'nitrite': 'Nitrites (mg/L NO₂⁻)'}
+
+# Logger CSV columns follow this sensor order after the Time column
+LOGGER_SENSOR_IDS = ['EX1', 'EX2', 'S01', 'S02', 'S03', 'S04', 'S05', 'S06', 'S07', 'S08', 'S09', 'S10']
+
+
+def file_digest(path):
+    # Content hash used to key caches derived from an input file
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def station_code(station_num):
+    return f'SS-{int(station_num):02d}'
+
+
+def logger_sensor_id(position):
+    return LOGGER_SENSOR_IDS[position] if position < len(LOGGER_SENSOR_IDS) else f'S{position + 1:02d}'
+
+
+def promote_header(raw):
+    # The United layout has a title row above the real header row
+    df = raw.iloc[1:].reset_index(drop=True)
+    df.columns = raw.iloc[0]
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df
+
+
+def load_united(path=UNITED_FILE):
+    return promote_header(pd.read_excel(path))
+
+
+def united_columns(header):
+    # Output column -> United column position for everything the plots read: station, Date, depth,
+    # each registered analyte (under its registry key) and the nitrate/nitrite dual-axis columns
+    positions = {}
+    for position, name in enumerate(header):
+        positions.setdefault(name, position)
+    columns = {'station': positions['station'], 'Date': positions['Date'], 'Depths (m)': positions['Depths (m)']}
+    for key, analyte in ANALYTES.items():
+        column = analyte['column']
+        columns[key] = column if isinstance(column, int) else positions[column]
+    for column in DUAL_AXIS_COLUMNS.values():
+        columns[column] = positions[column]
+    return columns
+
+
+def compact_united(raw, columns, float_dtype='float32'):
+    # raw: data rows with United column positions as labels. Codes become categoricals and analytes
+    # float32 with a boolean '<key>_censored' column; everything else in the workbook is dropped.
+    # Censored values are stored at their detection limit; analyte_values blanks them for plotting.
+    stations = raw[columns['station']]
+    sensor = split_station_codes(stations)[1]
+    df = pd.DataFrame({
+        'station': stations.astype('category'),
+        'site': stations.astype(str).str.extract(r'^(SS-\d+)', expand=False).astype('category'),
+        'sensor': sensor.astype('category'),
+        'Date': pd.to_datetime(raw[columns['Date']]),
+        'Depths (m)': pd.to_numeric(raw[columns['Depths (m)']], errors='coerce'),
+    })
+    for name, position in list(columns.items())[3:]:
+        values, censored = parse_censored(raw[position])
+        df[name] = values.astype(float_dtype)
+        df[f'{name}_censored'] = censored.to_numpy()
+    return df
+
+
+def iter_united_batches(path=UNITED_FILE, batch_rows=BATCH_ROWS, float_dtype='float32'):
+    # Compact frames of up to batch_rows samples, read row by row from a read-only workbook: memory stays
+    # bounded by one batch whatever the sheet size. Index labels continue across batches, as in load_united.
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        next(rows, None)  # title row
+        header = next(rows, None)
+        if header is None:
+            raise ValueError(f"'{path}' has no header row")
+        columns = united_columns(header)
+        positions = sorted(set(columns.values()))
+        if positions[-1] >= len(header):
+            raise ValueError(f"'{path}' has {len(header)} columns, the United layout needs {positions[-1] + 1}")
+        records, start = [], 0
+        for row in rows:
+            # Only rows empty in every cell are skipped, as read_excel does; a row with data solely in
+            # unregistered columns is kept, so row positions match load_united and the QA flags
+            if all(value is None or value == '' for value in row):
+                continue
+            records.append([row[p] if p < len(row) else None for p in positions])
+            if len(records) == batch_rows:
+                yield _record_batch(records, positions, columns, start, float_dtype)
+                start += len(records)
+                records = []
+        if records:
+            yield _record_batch(records, positions, columns, start, float_dtype)
+    finally:
+        workbook.close()
+
+
+def _record_batch(records, positions, columns, start, float_dtype):
+    raw = pd.DataFrame(records, columns=positions, dtype=object)
+    raw.index += start
+    return compact_united(raw, columns, float_dtype)
+
+
+def load_united_compact(path=UNITED_FILE, stream=None):
+    # Same rows as load_united, reading only the registered columns into compact dtypes. Analytes are keyed
+    # by their registry key, which analyte_values and normalise_united resolve before column positions.
+    # stream=None streams workbooks larger than STREAM_MIN_BYTES.
+    if stream is None:
+        stream = path.lower().endswith('.xlsx') and os.path.getsize(path) > STREAM_MIN_BYTES
+    if stream:
+        df = pd.concat(iter_united_batches(path))
+        # Batches carry their own category sets; concat falls back to object where they differ
+        for column in ('station', 'site', 'sensor'):
+            df[column] = df[column].astype('category')
+        return df
+    header = pd.read_excel(path, header=None, skiprows=1, nrows=1).iloc[0]
+    columns = united_columns(header)
+    raw = pd.read_excel(path, header=None, skiprows=2, usecols=sorted(set(columns.values())))
+    return compact_united(raw, columns)
+
+
+def parse_censored(values):
+    # '<0.05' style entries below the detection limit: keep the limit as the value and flag the row
+    text = values.astype(str).str.strip()
+    censored = text.str.startswith('<')
+    return pd.to_numeric(text.str.lstrip('<').str.strip(), errors='coerce'), censored
+
+
+def normalise_united(df):
+    # One row per sample with site/sensor codes and every registered analyte as a numeric column
+    station_num, sensor = split_station_codes(df['station'])
+    normalised = pd.DataFrame({
+        'station': df['station'].astype(str),
+        'site': station_num.map(station_code, na_action='ignore'),
+        'sensor': sensor,
+        'Date': pd.to_datetime(df['Date'], errors='coerce'),
+        'Depths (m)': pd.to_numeric(df['Depths (m)'], errors='coerce'),
+    })
+    for key, analyte in ANALYTES.items():
+        if f'{key}_censored' in df.columns:
+            values, censored = df[key].astype(float), df[f'{key}_censored']
+        else:
+            values, censored = parse_censored(analyte_column(df, key))
+        normalised[analyte['name']], normalised[f"{analyte['name']}_censored"] = values, censored
+    return normalised
+
+
+def analyte_column(df, key):
+    # Compact frames (load_united_compact) hold the analyte under its key; United itself by position or header
+    if key in df.columns:
+        return df[key]
+    column = ANALYTES[key]['column']
+    return df.iloc[:, column] if isinstance(column, int) else df[column]
+
+
+def analyte_values(df, key, censored=False):
+    # Numeric values as the plots read them: '<x' entries below the detection limit are NaN unless censored=True,
+    # which keeps them at the limit. Compact frames store the limit, so their censored rows are blanked here.
+    if censored and f'{key}_censored' not in df.columns:
+        return parse_censored(analyte_column(df, key))[0]
+    values = pd.to_numeric(analyte_column(df, key), errors='coerce')
+    if not censored and f'{key}_censored' in df.columns:
+        values = values.mask(df[f'{key}_censored'])
+    return values
+
+
+def split_station_codes(stations):
+    # 'SS-07-EX1' -> (7, 'EX1'), 'SS-07-03' -> (7, 'S03'), matching the logger column ids
+    parts = stations.astype(str).str.extract(r'^SS-(\d+)-(EX\d+|\d+)$')
+    station_num = pd.to_numeric(parts[0], errors='coerce').astype('Int64')
+    sensor = parts[1].where(parts[1].str.startswith('EX', na=False),
+                            'S' + parts[1].str.zfill(2))
+    return station_num, sensor
+
+
+def logger_depth_m(header, position):
+    # Depth columns are headed by their depth, e.g. '0.5' or '50 cm'; fall back to column order
+    match = re.search(r'\d+(?:\.\d+)?', str(header))
+    if match is None:
+        return float(position)
+    depth = float(match.group())
+    return depth / 100 if 'cm' in str(header).lower() else depth
+
+
+def load_logger(station_num, path=None):
+    data = pd.read_csv(path or f'{station_num}.csv')
+    data['Time'] = pd.to_datetime(data['Time'], format=LOGGER_TIME_FORMAT)
+    return data
+
+
+def iter_loggers(station_numbers=STATION_NUMBERS):
+    for station_num in station_numbers:
+        try:
+            yield station_num, load_logger(station_num)
+        except FileNotFoundError:
+            print(f'  No data file found for Station {station_num}')
+
+
+def load_precip(path=PRECIP_FILE):
+    precip = pd.read_excel(path)
+    precip['Date & Time [UTC]'] = pd.to_datetime(precip['Date & Time [UTC]'])
+    return precip
+
+
+def daily_precip(precip):
+    # Daily totals, the resolution every figure draws its rain bars at
+    daily = precip.set_index('Date & Time [UTC]')['Precipitation'].resample('D').sum(min_count=1)
+    return daily.dropna().reset_index()
+
+
+def dual_axis_frame(united, kind):
+    # United rows with a numeric nitrate/nitrite value ('<' detection limits taken at face value)
+    column = DUAL_AXIS_COLUMNS[kind]
+    if f'{column}_censored' in united.columns:
+        # Compact frames are already numeric
+        return united[united[column].notna()]
+    frame = united.copy()
+    frame[column] = parse_censored(frame[column])[0]
+    return frame.dropna(subset=[column])
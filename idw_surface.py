@@ -0,0 +1,90 @@
+import hashlib
+import os
+import numpy as np
+from scipy.spatial import cKDTree
+
+IDW_DIR = 'idw_cache'
+# Part of every cache key; bump when the interpolation changes
+CACHE_VERSION = 2
+# Grid cells along the longer side of the map
+DEFAULT_RESOLUTION = 300
+DEFAULT_NEIGHBOURS = 8
+DEFAULT_POWER = 2.0
+# Grid points per KD-tree query, which bounds the (points x k) distance arrays
+QUERY_CHUNK = 250000
+
+
+def grid_shape(bounds, resolution=DEFAULT_RESOLUTION):
+    west, east, south, north = bounds
+    width, height = east - west, north - south
+    if width >= height:
+        return max(1, round(resolution * height / width)), resolution
+    return resolution, max(1, round(resolution * width / height))
+
+
+def idw_weights(x, y, bounds, resolution=DEFAULT_RESOLUTION, k=DEFAULT_NEIGHBOURS, power=DEFAULT_POWER):
+    # Nearest sample indices and normalised-later weights for every grid cell centre: (cells x k) each.
+    # The tree is queried once; any number of value sets at the same points reuse the result.
+    west, east, south, north = bounds
+    n_rows, n_cols = grid_shape(bounds, resolution)
+    cell_x = west + (np.arange(n_cols) + 0.5) * (east - west) / n_cols
+    cell_y = south + (np.arange(n_rows) + 0.5) * (north - south) / n_rows
+    grid = np.column_stack([np.tile(cell_x, n_rows), np.repeat(cell_y, n_cols)])
+    tree = cKDTree(np.column_stack([x, y]))
+    k = min(k, tree.n)
+    distance = np.empty((len(grid), k))
+    index = np.empty((len(grid), k), dtype=np.intp)
+    for start in range(0, len(grid), QUERY_CHUNK):
+        d, i = tree.query(grid[start:start + QUERY_CHUNK], k=k, workers=-1)
+        distance[start:start + QUERY_CHUNK] = d.reshape(-1, k)
+        index[start:start + QUERY_CHUNK] = i.reshape(-1, k)
+    with np.errstate(divide='ignore'):
+        weights = 1.0 / distance ** power
+    # A cell centre on top of a sample takes that sample's value
+    exact = distance[:, 0] == 0
+    weights[exact] = 0.0
+    weights[exact, 0] = 1.0
+    return index, weights, (n_rows, n_cols)
+
+
+def idw_surface(values, index, weights, shape):
+    # Weighted mean of the k neighbours; neighbours without a value (NaN) drop out of both sums
+    neighbour_values = np.asarray(values, dtype=float)[index]
+    valid = ~np.isnan(neighbour_values)
+    w = np.where(valid, weights, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        surface = (w * np.where(valid, neighbour_values, 0.0)).sum(axis=1) / w.sum(axis=1)
+    return surface.reshape(shape)
+
+
+def _digest(x, y, values, bounds, resolution, k, power):
+    digest = hashlib.sha1()
+    for array in (x, y, values):
+        digest.update(np.ascontiguousarray(array, dtype=float).tobytes())
+    digest.update(repr((CACHE_VERSION, tuple(bounds), resolution, k, power)).encode())
+    return digest.hexdigest()
+
+
+def cached_surfaces(x, y, value_sets, bounds, resolution=DEFAULT_RESOLUTION, k=DEFAULT_NEIGHBOURS,
+                    power=DEFAULT_POWER, cache_dir=IDW_DIR):
+    # value_sets: (n_sets x n_points), e.g. one row per campaign. Returns (n_sets x rows x cols) surfaces,
+    # cached on disk per dataset hash and grid resolution. Neighbours are chosen among the points each set
+    # has a value for, so a sparse campaign still covers the whole grid; sets sampled at the same points
+    # share one KD-tree query.
+    value_sets = np.atleast_2d(np.asarray(value_sets, dtype=float))
+    path = os.path.join(cache_dir, f'idw_{_digest(x, y, value_sets, bounds, resolution, k, power)[:16]}.npy')
+    if os.path.exists(path):
+        return np.load(path)
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    surfaces = np.full((len(value_sets), *grid_shape(bounds, resolution)), np.nan)
+    patterns, inverse = np.unique(~np.isnan(value_sets), axis=0, return_inverse=True)
+    for pattern, valid in enumerate(patterns):
+        if not valid.any():
+            continue
+        index, weights, shape = idw_weights(x[valid], y[valid], bounds, resolution, k, power)
+        for i in np.flatnonzero(inverse.reshape(-1) == pattern):
+            surfaces[i] = idw_surface(value_sets[i, valid], index, weights, shape)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(f'{path}.tmp.npy', surfaces)
+    os.replace(f'{path}.tmp.npy', path)
+    return surfaces
@@ -0,0 +1,177 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import pandas as pd
+from groundwater_io import ANALYTES, BATCH_ROWS, UNITED_FILE, iter_united_batches, normalise_united, promote_header
+
+DATASET_DIR = 'united_dataset'
+MANIFEST_FILE = '_ingested.json'
+PARTITION_COLS = ['site', 'year']
+REQUIRED_COLUMNS = ['station', 'Date', 'Depths (m)']
+
+
+def read_campaign(path):
+    # Workbooks and CSV exports share the United layout: a title row, then the header row
+    if path.lower().endswith('.csv'):
+        raw = pd.read_csv(path, header=None, dtype=object)
+        raw = raw.iloc[1:]
+    else:
+        raw = pd.read_excel(path)
+    try:
+        return promote_header(raw)
+    except KeyError as exc:
+        raise ValueError(f"'{path}' has no {exc} column in its header row") from exc
+
+
+def validate_campaign(df):
+    problems = [f'missing column {column!r}' for column in REQUIRED_COLUMNS if column not in df.columns]
+    width = max(a['column'] for a in ANALYTES.values() if isinstance(a['column'], int)) + 1
+    if df.shape[1] < width:
+        problems.append(f'expected at least {width} columns in the United layout, found {df.shape[1]}')
+    named = [a['column'] for a in ANALYTES.values() if not isinstance(a['column'], int)]
+    problems += [f'missing column {column!r}' for column in named if column not in df.columns]
+    if not problems:
+        problems = row_problems(df)
+    if problems:
+        raise ValueError('Campaign does not match the United layout:\n  ' + '\n  '.join(problems))
+
+
+def row_problems(df):
+    problems = []
+    bad_stations = ~df['station'].astype(str).str.match(r'^SS-\d+-(EX\d+|\d+)$')
+    if bad_stations.any():
+        problems.append(f'{bad_stations.sum()} rows with unrecognised station codes, '
+                        f'e.g. {df.loc[bad_stations, "station"].iloc[0]!r}')
+    if df['Date'].isna().any():
+        problems.append(f'{df["Date"].isna().sum()} rows without a sampling date')
+    return problems
+
+
+def read_manifest(dataset_dir=DATASET_DIR):
+    try:
+        with open(os.path.join(dataset_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'batches': []}
+
+
+def _write_manifest(manifest, dataset_dir):
+    path = os.path.join(dataset_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _batch_digest(normalised):
+    return hashlib.sha1(pd.util.hash_pandas_object(normalised, index=False).to_numpy().tobytes()).hexdigest()[:16]
+
+
+def ingest(path, dataset_dir=DATASET_DIR, stream=False, batch_rows=BATCH_ROWS):
+    # Appends one campaign as new files under site=SS-NN/year=YYYY; existing partitions are never rewritten
+    if stream:
+        return ingest_streamed(path, dataset_dir, batch_rows)
+    print(f"Reading '{path}'...")
+    df = read_campaign(path)
+    validate_campaign(df)
+    normalised = normalise_united(df)
+    normalised['year'] = normalised['Date'].dt.year.astype('int32')
+
+    digest = _batch_digest(normalised)
+    manifest = read_manifest(dataset_dir)
+    if any(batch['digest'] == digest for batch in manifest['batches']):
+        print(f"  '{path}' was already ingested, nothing to do")
+        return 0
+
+    os.makedirs(dataset_dir, exist_ok=True)
+    normalised.to_parquet(dataset_dir, engine='pyarrow', index=False, partition_cols=PARTITION_COLS,
+                          basename_template=f'{digest}-{{i}}.parquet',
+                          existing_data_behavior='overwrite_or_ignore')
+    manifest['batches'].append({
+        'digest': digest,
+        'source': os.path.abspath(path),
+        'rows': len(normalised),
+        'partitions': sorted(f'site={s}/year={y}' for s, y in
+                             normalised[PARTITION_COLS].drop_duplicates().itertuples(index=False)),
+    })
+    _write_manifest(manifest, dataset_dir)
+    print(f'  Appended {len(normalised)} samples to {len(manifest["batches"][-1]["partitions"])} partitions')
+    return len(normalised)
+
+
+def ingest_streamed(path, dataset_dir=DATASET_DIR, batch_rows=BATCH_ROWS):
+    # Same result as ingest for a workbook too large to parse whole: record batches are normalised and written
+    # to a staging directory one at a time, then moved into the dataset under the campaign digest. The digest
+    # chains the row hashes of every batch, so it equals the one ingest computes over the whole campaign.
+    print(f"Streaming '{path}'...")
+    staging = os.path.join(dataset_dir, f'_staging-{os.getpid()}')
+    digest = hashlib.sha1()
+    rows, partitions = 0, set()
+    try:
+        try:
+            for n, batch in enumerate(iter_united_batches(path, batch_rows, float_dtype='float64')):
+                problems = row_problems(batch)
+                if problems:
+                    raise ValueError(f'Campaign does not match the United layout (batch {n + 1}):\n  '
+                                     + '\n  '.join(problems))
+                normalised = normalise_united(batch).reset_index(drop=True)
+                normalised['year'] = normalised['Date'].dt.year.astype('int32')
+                digest.update(pd.util.hash_pandas_object(normalised, index=False).to_numpy().tobytes())
+                normalised.to_parquet(staging, engine='pyarrow', index=False, partition_cols=PARTITION_COLS,
+                                      basename_template=f'{n}-{{i}}.parquet',
+                                      existing_data_behavior='overwrite_or_ignore')
+                partitions.update(f'site={s}/year={y}' for s, y in
+                                  normalised[PARTITION_COLS].drop_duplicates().itertuples(index=False))
+                rows += len(normalised)
+                print(f'  {rows} samples read')
+        except KeyError as exc:
+            raise ValueError(f"'{path}' has no {exc} column in its header row") from exc
+        digest = digest.hexdigest()[:16]
+        manifest = read_manifest(dataset_dir)
+        if any(batch['digest'] == digest for batch in manifest['batches']):
+            print(f"  '{path}' was already ingested, nothing to do")
+            return 0
+        for directory, _, files in os.walk(staging):
+            target = os.path.join(dataset_dir, os.path.relpath(directory, staging))
+            for name in files:
+                os.makedirs(target, exist_ok=True)
+                os.replace(os.path.join(directory, name), os.path.join(target, f'{digest}-{name}'))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    manifest['batches'].append({
+        'digest': digest,
+        'source': os.path.abspath(path),
+        'rows': rows,
+        'partitions': sorted(partitions),
+    })
+    _write_manifest(manifest, dataset_dir)
+    print(f'  Appended {rows} samples to {len(partitions)} partitions')
+    return rows
+
+
+def read_dataset(sites=None, years=None, columns=None, dataset_dir=DATASET_DIR):
+    # Only the partitions matching sites/years are opened
+    filters = []
+    if sites is not None:
+        filters.append(('site', 'in', list(sites)))
+    if years is not None:
+        filters.append(('year', 'in', [int(y) for y in years]))
+    df = pd.read_parquet(dataset_dir, engine='pyarrow', columns=columns, filters=filters or None)
+    for column in PARTITION_COLS:
+        if column in df.columns:
+            df[column] = df[column].astype(str) if column == 'site' else df[column].astype('int32')
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Append lab campaigns to the partitioned United dataset')
+    parser.add_argument('paths', nargs='*', help=f'campaign workbooks or CSV files (default: {UNITED_FILE})')
+    parser.add_argument('--dataset', default=DATASET_DIR)
+    parser.add_argument('--stream', action='store_true',
+                        help='read .xlsx workbooks row by row in batches instead of whole (bounded memory)')
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS)
+    args = parser.parse_args()
+    for path in args.paths or [UNITED_FILE]:
+        ingest(path, args.dataset, args.stream and path.lower().endswith('.xlsx'), args.batch_rows)
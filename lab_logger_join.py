@@ -0,0 +1,71 @@
+import pandas as pd
+from groundwater_io import load_united, split_station_codes, logger_sensor_id
+from logger_store import iter_loggers_mmap
+
+# Lab samples further than this from any logger reading stay unmatched
+DEFAULT_TOLERANCE = pd.Timedelta('6h')
+JOIN_COLUMNS = ['logger_time', 'logger_depth', 'water_content']
+
+
+def join_station(samples, logger, tolerance=DEFAULT_TOLERANCE):
+    # samples: lab rows of one station with 'row' and 'sensor' columns; logger: that station's N.csv frame.
+    # Each depth column is joined only to the samples of its own sensor, so the work stays
+    # linear in the number of readings instead of samples x readings.
+    samples = samples.sort_values('Date')
+    logger = logger.sort_values('Time')
+    matches = []
+    for position, depth in enumerate(logger.columns[1:]):
+        sensor_samples = samples[samples['sensor'] == logger_sensor_id(position)]
+        if sensor_samples.empty:
+            continue
+        readings = logger[['Time', depth]].dropna()
+        readings.columns = ['logger_time', 'water_content']
+        readings['logger_depth'] = depth
+        matched = pd.merge_asof(sensor_samples[['row', 'Date']], readings,
+                                left_on='Date', right_on='logger_time',
+                                direction='nearest', tolerance=tolerance)
+        matches.append(matched[['row'] + JOIN_COLUMNS])
+    if not matches:
+        return pd.DataFrame(columns=['row'] + JOIN_COLUMNS)
+    return pd.concat(matches, ignore_index=True)
+
+
+def join_lab_to_logger(united, loggers, tolerance=DEFAULT_TOLERANCE):
+    # loggers: iterable of (station_num, logger frame), e.g. logger_store.iter_loggers_mmap()
+    samples = pd.DataFrame({'row': united.index,
+                            'Date': pd.to_datetime(united['Date']).astype('datetime64[ns]')})
+    samples['station_num'], samples['sensor'] = split_station_codes(united['station'])
+    samples = samples.dropna(subset=['Date', 'station_num', 'sensor'])
+    by_station = dict(tuple(samples.groupby('station_num')))
+
+    matches = []
+    for station_num, logger in loggers:
+        station_samples = by_station.get(station_num)
+        if station_samples is None:
+            continue
+        logger = logger.copy()
+        logger['Time'] = logger['Time'].astype('datetime64[ns]')
+        matched = join_station(station_samples, logger, tolerance)
+        print(f'  Station {station_num}: {matched["water_content"].notna().sum()} of '
+              f'{len(station_samples)} samples matched to a logger reading')
+        matches.append(matched)
+
+    joined = united.copy()
+    for column in JOIN_COLUMNS:
+        joined[column] = pd.NA
+    if matches:
+        matched = pd.concat(matches, ignore_index=True).set_index('row')
+        joined.loc[matched.index, JOIN_COLUMNS] = matched[JOIN_COLUMNS]
+    joined['logger_time'] = pd.to_datetime(joined['logger_time'])
+    joined['water_content'] = pd.to_numeric(joined['water_content'], errors='coerce')
+    return joined
+
+
+if __name__ == '__main__':
+    print('Loading data...')
+    united = load_united()
+    print('Data loaded.')
+    joined = join_lab_to_logger(united, iter_loggers_mmap())
+    joined.to_csv('lab_logger_join.csv', index=False)
+    print(f"Matched {joined['water_content'].notna().sum()} of {len(joined)} lab samples")
+    print("Joined data saved to 'lab_logger_join.csv'")
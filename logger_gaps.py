@@ -0,0 +1,124 @@
+import argparse
+import numpy as np
+import pandas as pd
+from groundwater_io import STATION_NUMBERS, logger_sensor_id
+from logger_store import STORE_DIR, load_logger_mmap, open_station
+
+GAP_REPORT_FILE = 'logger_gap_report.csv'
+# Consecutive valid samples further apart than this many logging intervals form a gap
+GAP_FACTOR = 1.5
+# Gaps up to this long are interpolated; longer ones are broken with a NaN so lines do not bridge them
+DEFAULT_MAX_FILL = pd.Timedelta(hours=6)
+
+
+def sample_interval(times):
+    # Nominal logging interval in ns: the median spacing of the timestamps
+    steps = np.diff(np.asarray(times).view(np.int64))
+    steps = steps[steps > 0]
+    return int(np.median(steps)) if steps.size else None
+
+
+def _neighbours(valid):
+    # For every cell (columns x rows): index of the last valid sample strictly before it and of the
+    # first valid sample at or after it (-1 / n_rows when there is none)
+    n_rows = valid.shape[1]
+    positions = np.arange(n_rows)
+    last = np.maximum.accumulate(np.where(valid, positions, -1), axis=1)
+    previous = np.concatenate([np.full((valid.shape[0], 1), -1), last[:, :-1]], axis=1)
+    following = np.minimum.accumulate(np.where(valid, positions, n_rows)[:, ::-1], axis=1)[:, ::-1]
+    return previous, following
+
+
+def find_gaps(times, values, interval=None):
+    # Returns (column, start row, end row) of every gap between consecutive valid samples, all columns at once
+    t = np.asarray(times).view(np.int64)
+    interval = interval or sample_interval(times)
+    valid = ~np.isnan(values)
+    previous, _ = _neighbours(valid)
+    has_previous = valid & (previous >= 0)
+    spacing = np.where(has_previous, t - t[np.maximum(previous, 0)], 0)
+    column, end = np.nonzero(spacing > (GAP_FACTOR * interval if interval else np.inf))
+    return column, previous[column, end], end
+
+
+def fill_gaps(times, values, max_fill=DEFAULT_MAX_FILL):
+    # times: sorted datetime64[ns]; values: (columns x rows). Returns new (times, values, gaps):
+    # NaN runs no longer than max_fill are linearly interpolated in time, and a NaN row is inserted
+    # after every longer outage in the timestamps so plotted lines break instead of bridging it.
+    times = np.asarray(times, dtype='datetime64[ns]')
+    values = np.array(values, dtype=float)
+    t = times.view(np.int64)
+    interval = sample_interval(times)
+    column, start, end = find_gaps(times, values, interval)
+    if interval is None:
+        return times, values, (column, start, end, np.ones(column.size, bool))
+    limit = max(pd.Timedelta(max_fill).value, GAP_FACTOR * interval)
+    short = t[end] - t[start] <= limit
+
+    valid = ~np.isnan(values)
+    previous, following = _neighbours(valid)
+    cols, rows = np.nonzero(~valid & (previous >= 0) & (following < values.shape[1]))
+    before, after = previous[cols, rows], following[cols, rows]
+    inside = t[after] - t[before] <= limit
+    cols, rows, before, after = cols[inside], rows[inside], before[inside], after[inside]
+    weight = (t[rows] - t[before]) / (t[after] - t[before])
+    values[cols, rows] = values[cols, before] + weight * (values[cols, after] - values[cols, before])
+
+    breaks = np.flatnonzero(np.diff(t) > limit)
+    times = np.insert(times, breaks + 1, times[breaks] + np.timedelta64(interval, 'ns'))
+    values = np.insert(values, breaks + 1, np.nan, axis=1)
+    return times, values, (column, start, end, short)
+
+
+def fill_frame(frame, max_fill=DEFAULT_MAX_FILL):
+    # Same as fill_gaps for a frame in the logger layout (Time, then one column per depth)
+    depths = list(frame.columns[1:])
+    times, values, _ = fill_gaps(frame['Time'].to_numpy(dtype='datetime64[ns]'),
+                                 frame[depths].to_numpy(dtype=float).T, max_fill)
+    columns = {'Time': times}
+    columns.update(zip(depths, values))
+    return pd.DataFrame(columns)
+
+
+def station_gaps(station_num, max_fill=DEFAULT_MAX_FILL, store_dir=STORE_DIR):
+    load_logger_mmap(station_num, store_dir)
+    times, values, entry = open_station(station_num, store_dir)
+    interval = sample_interval(times)
+    column, start, end = find_gaps(times, values, interval)
+    duration = pd.to_timedelta(times[end] - times[start])
+    limit = max(pd.Timedelta(max_fill), pd.Timedelta(GAP_FACTOR * (interval or 0), 'ns'))
+    return pd.DataFrame({
+        'station': station_num,
+        'sensor': [logger_sensor_id(i) for i in column],
+        'column': [entry['columns'][i] for i in column],
+        'start': times[start],
+        'end': times[end],
+        'duration_h': duration / pd.Timedelta(hours=1),
+        'missing_samples': (duration / pd.Timedelta(interval or 1, 'ns')).round().astype(int) - 1,
+        'action': np.where(duration <= limit, 'interpolate', 'break'),
+    })
+
+
+def gap_report(station_numbers=STATION_NUMBERS, max_fill=DEFAULT_MAX_FILL, store_dir=STORE_DIR):
+    reports = []
+    for station_num in station_numbers:
+        try:
+            reports.append(station_gaps(station_num, max_fill, store_dir))
+        except FileNotFoundError:
+            print(f'  No data file found for Station {station_num}')
+    return pd.concat(reports, ignore_index=True) if reports else pd.DataFrame()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report outages in the logger water-content series')
+    parser.add_argument('--max-fill', type=float, default=DEFAULT_MAX_FILL / pd.Timedelta(hours=1),
+                        help='longest gap to interpolate, in hours')
+    parser.add_argument('--output', default=GAP_REPORT_FILE)
+    args = parser.parse_args()
+    print('Scanning logger series for gaps...')
+    report = gap_report(max_fill=pd.Timedelta(hours=args.max_fill))
+    report.to_csv(args.output, index=False)
+    if not report.empty:
+        summary = report.groupby(['station', 'action']).size().unstack(fill_value=0)
+        print(summary.to_string())
+    print(f"Gap report with {len(report)} gaps saved as '{args.output}'")
@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from groundwater_io import STATION_NUMBERS
+from logger_store import STORE_DIR, keyed_lock, load_logger_mmap, open_station, update_metadata
+
+PYRAMID_DIR = 'logger_pyramid'
+METADATA_FILE = 'metadata.json'
+# Aggregation levels, finest first. Bins are anchored on a Monday so weekly bins run Monday-Sunday.
+LEVELS = {
+    'hourly': np.timedelta64(1, 'h'),
+    'daily': np.timedelta64(1, 'D'),
+    'weekly': np.timedelta64(7, 'D'),
+}
+ANCHOR = np.datetime64('1970-01-05T00:00', 'ns')
+# Roughly the pixel width of the 10 in, 300 dpi dual-axis figures
+DEFAULT_POINTS = 3000
+
+
+def aggregate(times, values, width):
+    # times: sorted datetime64[ns]; values: (columns x rows). One reduceat per statistic over all columns.
+    bins = (times - ANCHOR) // width
+    if len(bins) == 0:
+        empty = np.empty((values.shape[0], 0))
+        return {'time': times[:0], 'min': empty, 'max': empty, 'sum': empty,
+                'count': empty.astype(np.int64)}
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    valid = ~np.isnan(values)
+    return {
+        'time': ANCHOR + bins[starts] * width,
+        'min': np.fmin.reduceat(values, starts, axis=1),
+        'max': np.fmax.reduceat(values, starts, axis=1),
+        'sum': np.add.reduceat(np.where(valid, values, 0.0), starts, axis=1),
+        'count': np.add.reduceat(valid.astype(np.int64), starts, axis=1),
+    }
+
+
+def _level_path(pyramid_dir, station_num, level):
+    return os.path.join(pyramid_dir, f'station_{station_num}_{level}.npz')
+
+
+def read_metadata(pyramid_dir=PYRAMID_DIR):
+    try:
+        with open(os.path.join(pyramid_dir, METADATA_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'stations': {}}
+
+
+def _save_level(path, arrays):
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def refresh_station(station_num, store_dir=STORE_DIR, pyramid_dir=PYRAMID_DIR):
+    # Brings the raw store and every level up to date. When rows were only appended, each level
+    # re-aggregates just its last (possibly partial) bin and the new rows. One thread per station at a time.
+    with keyed_lock(os.path.abspath(pyramid_dir), station_num):
+        return _refresh_station(station_num, store_dir, pyramid_dir)
+
+
+def _refresh_station(station_num, store_dir, pyramid_dir):
+    load_logger_mmap(station_num, store_dir)
+    times, values, entry = open_station(station_num, store_dir)
+    metadata = read_metadata(pyramid_dir)
+    seen = metadata['stations'].get(str(station_num))
+    if seen is not None and seen['rows'] == len(times) and seen['columns'] == entry['columns']:
+        return seen
+    appended = (seen is not None and seen['columns'] == entry['columns'] and 0 < seen['rows'] < len(times)
+                and int(times[seen['rows'] - 1].astype(np.int64)) == seen['last_time'])
+
+    os.makedirs(pyramid_dir, exist_ok=True)
+    bins = {}
+    for level, width in LEVELS.items():
+        path = _level_path(pyramid_dir, station_num, level)
+        if appended and os.path.exists(path):
+            with np.load(path) as stored:
+                old = dict(stored)
+            keep = max(len(old['time']) - 1, 0)
+            first_row = np.searchsorted(times, old['time'][keep]) if len(old['time']) else 0
+            new = aggregate(times[first_row:], values[:, first_row:], width)
+            arrays = {k: np.concatenate([old[k][..., :keep], new[k]], axis=-1) for k in new}
+        else:
+            arrays = aggregate(times, values, width)
+        _save_level(path, arrays)
+        bins[level] = len(arrays['time'])
+
+    summary = update_metadata(pyramid_dir, station_num, {
+        'rows': len(times),
+        'last_time': int(times[-1].astype(np.int64)) if len(times) else None,
+        'columns': entry['columns'],
+        'bins': bins,
+    }, read_metadata)
+    print(f"  Pyramid for Station {station_num} {'extended' if appended else 'rebuilt'}: "
+          + ', '.join(f'{level} {count}' for level, count in bins.items()))
+    return summary
+
+
+def choose_level(summary, target_points=DEFAULT_POINTS):
+    # Coarsest level that still has at least one value per output pixel
+    for level in reversed(list(LEVELS)):
+        if summary['bins'][level] >= target_points:
+            return level
+    return 'raw'
+
+
+def station_frames(station_num, target_points=DEFAULT_POINTS, store_dir=STORE_DIR, pyramid_dir=PYRAMID_DIR):
+    # Returns (mean, min, max) frames in the logger layout (Time, then one column per depth).
+    # At the raw level min and max are None.
+    summary = refresh_station(station_num, store_dir, pyramid_dir)
+    level = choose_level(summary, target_points)
+    print(f'  Using {level} level for Station {station_num}')
+    if level == 'raw':
+        return load_logger_mmap(station_num, store_dir), None, None
+    with np.load(_level_path(pyramid_dir, station_num, level)) as stored:
+        arrays = dict(stored)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        arrays['mean'] = np.where(arrays['count'] > 0, arrays['sum'] / arrays['count'], np.nan)
+    frames = []
+    for stat in ['mean', 'min', 'max']:
+        frame = pd.DataFrame(arrays[stat].T, columns=summary['columns'], copy=False)
+        frame.insert(0, 'Time', arrays['time'])
+        frames.append(frame)
+    return tuple(frames)
+
+
+if __name__ == '__main__':
+    print('Refreshing logger pyramid...')
+    for station_num in STATION_NUMBERS:
+        try:
+            refresh_station(station_num)
+        except FileNotFoundError:
+            print(f'  No data file found for Station {station_num}')
+    print(f"Logger pyramid written to '{PYRAMID_DIR}'")
@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from groundwater_io import STATION_NUMBERS, load_logger, logger_sensor_id
+
+STORE_DIR = 'logger_store'
+METADATA_FILE = 'metadata.json'
+
+# Conversions and metadata updates from threads in one process (pipeline leaves, render service requests)
+# are serialised per station and per metadata file
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def keyed_lock(*key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.RLock())
+
+
+def _tmp_path(path):
+    # Unique per process and thread, so concurrent writers never rename each other's file
+    return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+def _source_path(station_num):
+    return f'{station_num}.csv'
+
+
+def _array_path(store_dir, station_num, part):
+    return os.path.join(store_dir, f'station_{station_num}_{part}.npy')
+
+
+def read_metadata(store_dir=STORE_DIR):
+    try:
+        with open(os.path.join(store_dir, METADATA_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'stations': {}}
+
+
+def write_metadata(metadata, path):
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def update_metadata(directory, station_num, entry, read=read_metadata):
+    # Read-modify-write of one station's entry; other stations' entries written meanwhile are kept
+    path = os.path.join(directory, METADATA_FILE)
+    with keyed_lock(os.path.abspath(path)):
+        metadata = read(directory)
+        metadata['stations'][str(station_num)] = entry
+        write_metadata(metadata, path)
+    return entry
+
+
+def _save_array(path, array):
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {'source': path, 'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns}
+
+
+def convert_station(station_num, store_dir=STORE_DIR, source=None):
+    # Writes the Time column as int64 ns and the depth columns as one (columns x rows) array,
+    # so every depth series is a contiguous slice of the memory map
+    source = source or _source_path(station_num)
+    logger = load_logger(station_num, source)
+    depths = list(logger.columns[1:])
+    times = logger['Time'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    values = np.ascontiguousarray(logger[depths].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float).T)
+
+    os.makedirs(store_dir, exist_ok=True)
+    _save_array(_array_path(store_dir, station_num, 'time'), times)
+    _save_array(_array_path(store_dir, station_num, 'values'), values)
+    entry = update_metadata(store_dir, station_num, {
+        'columns': depths,
+        'sensor_ids': [logger_sensor_id(i) for i in range(len(depths))],
+        'rows': len(times),
+        **_source_signature(source),
+    })
+    print(f'  Stored {len(times)} readings x {len(depths)} depths for Station {station_num}')
+    return entry
+
+
+def is_current(station_num, store_dir=STORE_DIR, metadata=None):
+    entry = (metadata or read_metadata(store_dir))['stations'].get(str(station_num))
+    if entry is None or not os.path.exists(_array_path(store_dir, station_num, 'values')):
+        return False
+    source = entry['source']
+    if not os.path.exists(source):
+        return True
+    return {k: entry[k] for k in ('source', 'source_size', 'source_mtime_ns')} == _source_signature(source)
+
+
+def open_station(station_num, store_dir=STORE_DIR):
+    # Read-only memory maps: pages are shared between runs and worker processes, nothing is copied
+    entry = read_metadata(store_dir)['stations'][str(station_num)]
+    times = np.load(_array_path(store_dir, station_num, 'time'), mmap_mode='r')
+    values = np.load(_array_path(store_dir, station_num, 'values'), mmap_mode='r')
+    return times.view('datetime64[ns]'), values, entry
+
+
+def load_logger_mmap(station_num, store_dir=STORE_DIR):
+    # Same layout as groundwater_io.load_logger (Time, then one column per depth), backed by the store.
+    # Converts the CSV on first use or when it changed; raises FileNotFoundError if neither exists.
+    with keyed_lock(os.path.abspath(store_dir), station_num):
+        if not is_current(station_num, store_dir):
+            if not os.path.exists(_source_path(station_num)):
+                raise FileNotFoundError(_source_path(station_num))
+            convert_station(station_num, store_dir)
+    times, values, entry = open_station(station_num, store_dir)
+    # values.T is a view; pandas keeps it as the single (columns x rows) block backed by the memory map
+    df = pd.DataFrame(values.T, columns=entry['columns'], copy=False)
+    df.insert(0, 'Time', times)
+    return df
+
+
+def iter_loggers_mmap(station_numbers=STATION_NUMBERS, store_dir=STORE_DIR):
+    for station_num in station_numbers:
+        try:
+            yield station_num, load_logger_mmap(station_num, store_dir)
+        except FileNotFoundError:
+            print(f'  No data file found for Station {station_num}')
+
+
+if __name__ == '__main__':
+    print('Converting logger CSV files...')
+    for station_num in STATION_NUMBERS:
+        if not os.path.exists(_source_path(station_num)):
+            print(f'  No data file found for Station {station_num}')
+        elif is_current(station_num):
+            print(f'  Station {station_num} is up to date')
+        else:
+            convert_station(station_num)
+    print(f"Logger store written to '{STORE_DIR}'")
@@ -0,0 +1,83 @@
+import functools
+import numpy as np
+import pandas as pd
+from groundwater_io import analyte_values, station_code
+
+CIRCLE_FILE = 'circle-Data.xlsx'
+NITRATE_COLUMN = 'Average Nitrates in 0-2 m (mg/L NO₃⁻) '
+EARTH_RADIUS = 6378137.0
+# The map shows the stations plus this many times their spread on every side
+MAP_BUFFER = 2.0
+# Campaign maps: samples from 0-2 m, averaged per site and month
+MAP_MAX_DEPTH = 2.0
+SURFACE_CMAP = 'YlOrRd'
+SURFACE_ALPHA = 0.55
+
+
+def load_circle_data(path=CIRCLE_FILE):
+    # Station coordinates (x/y in 1e-6 degrees) with the 0-2 m average nitrate, as nitrate_station_map.py reads them
+    df = pd.read_excel(path)
+    df['x'] = pd.to_numeric(df['x'], errors='coerce')
+    df['y'] = pd.to_numeric(df['y'], errors='coerce')
+    df[NITRATE_COLUMN] = pd.to_numeric(df[NITRATE_COLUMN], errors='coerce').fillna(0)
+    df['lon'] = df['x'] / 1000000
+    df['lat'] = df['y'] / 1000000
+    number = pd.to_numeric(df['Station'].astype(str).str.extract(r'(\d+)', expand=False), errors='coerce')
+    df['site'] = number.map(station_code, na_action='ignore')
+    return df
+
+
+def map_campaigns(df, stations):
+    # Mean 0-2 m nitrate per (month, site) as a campaigns x stations array (NaN where a site was not sampled)
+    frame = pd.DataFrame({'site': df['station'].astype(str).str.extract(r'^(SS-\d+)', expand=False),
+                          'campaign': pd.to_datetime(df['Date']).dt.to_period('M'),
+                          'depth': pd.to_numeric(df['Depths (m)'], errors='coerce'),
+                          'value': analyte_values(df, 'no3')})
+    frame = frame[frame['depth'] <= MAP_MAX_DEPTH].dropna(subset=['site', 'campaign', 'value'])
+    table = frame.pivot_table(index='campaign', columns='site', values='value', aggfunc='mean')
+    return table.reindex(columns=stations)
+
+
+def to_web_mercator(lon, lat):
+    # EPSG:4326 degrees -> EPSG:3857 metres, the projection of the basemap tiles
+    lon = np.asarray(lon, dtype=float)
+    lat = np.clip(np.asarray(lat, dtype=float), -85.05112878, 85.05112878)
+    x = np.radians(lon) * EARTH_RADIUS
+    y = np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) * EARTH_RADIUS
+    return x, y
+
+
+def map_bounds(lon, lat, buffer=MAP_BUFFER):
+    # (west, east, south, north) in EPSG:3857 around the stations
+    lon_min, lon_max = np.nanmin(lon), np.nanmax(lon)
+    lat_min, lat_max = np.nanmin(lat), np.nanmax(lat)
+    lon_buffer = (lon_max - lon_min) * buffer
+    lat_buffer = (lat_max - lat_min) * buffer
+    (west, east), (south, north) = to_web_mercator([lon_min - lon_buffer, lon_max + lon_buffer],
+                                                   [lat_min - lat_buffer, lat_max + lat_buffer])
+    return float(west), float(east), float(south), float(north)
+
+
+@functools.lru_cache(maxsize=4)
+def basemap_image(bounds):
+    # OpenStreetMap tiles for the bounds, fetched and stitched once per process; returns (image, extent)
+    import contextily as ctx
+    west, east, south, north = bounds
+    return ctx.bounds2img(west, south, east, north, ll=False, source=ctx.providers.OpenStreetMap.Mapnik)
+
+
+def draw_basemap(ax, bounds):
+    image, extent = basemap_image(bounds)
+    ax.imshow(image, extent=extent, interpolation='bilinear', zorder=0)
+    ax.set_xlim(bounds[0], bounds[1])
+    ax.set_ylim(bounds[2], bounds[3])
+    ax.set_xticks([])
+    ax.set_yticks([])
+    ax.set_frame_on(False)
+
+
+def draw_surface(ax, surface, bounds, vmax=None):
+    # Interpolated nitrate raster between the basemap and the station circles
+    west, east, south, north = bounds
+    return ax.imshow(np.ma.masked_invalid(surface), extent=(west, east, south, north), origin='lower',
+                     cmap=SURFACE_CMAP, alpha=SURFACE_ALPHA, vmin=0, vmax=vmax, interpolation='bilinear', zorder=1)
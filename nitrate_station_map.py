@@ -1,65 +1,89 @@
+import argparse
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import contextily as ctx
+import matplotlib
 from matplotlib.lines import Line2D
+from figure_writer import flush_figures, new_figure, save_figure
+from map_layers import (NITRATE_COLUMN, draw_basemap, draw_surface, load_circle_data, map_bounds, map_campaigns,
+                        to_web_mercator)
 
-# Read the Excel file
-df = pd.read_excel('circle-Data.xlsx')
 
-# Convert columns to numeric, replacing any non-numeric values with NaN
-df['x'] = pd.to_numeric(df['x'], errors='coerce')
-df['y'] = pd.to_numeric(df['y'], errors='coerce')
-df['Average Nitrates in 0-2 m (mg/L NO₃⁻) '] = pd.to_numeric(df['Average Nitrates in 0-2 m (mg/L NO₃⁻) '], errors='coerce')
+def average_points(circles):
+    # One point per station: the 0-2 m average from circle-Data.xlsx
+    return circles.rename(columns={NITRATE_COLUMN: 'value'})[['Station', 'lon', 'lat', 'value']]
 
-# Fill NaN values with 0 for nitrate concentrations
-df['Average Nitrates in 0-2 m (mg/L NO₃⁻) '] = df['Average Nitrates in 0-2 m (mg/L NO₃⁻) '].fillna(0)
 
-# Convert coordinates to decimal degrees (assuming x/y are in 1e6 format)
-df['lon'] = df['x'] / 1000000
-df['lat'] = df['y'] / 1000000
+def campaign_points(circles, united):
+    # One point per station and monthly campaign, placed at the station's coordinates
+    stations = circles.dropna(subset=['site']).drop_duplicates('site')
+    table = map_campaigns(united, list(stations['site']))
+    values = table.stack().rename('value').reset_index()
+    return values.merge(stations[['site', 'Station', 'lon', 'lat']], on='site')[['Station', 'lon', 'lat', 'value']]
 
-# Create a figure and axis
-fig, ax = plt.subplots(figsize=(12, 7))
 
-# Assign a unique color to each station
-stations = df['Station'].unique()
-cmap = plt.get_cmap('tab20', len(stations))
-colors = {station: cmap(i) for i, station in enumerate(stations)}
+def nitrate_surface(points, bounds, resolution):
+    # IDW surface over the per-location means, so stations with many campaigns do not crowd out the others
+    from idw_surface import cached_surfaces
+    located = points.dropna(subset=['lon', 'lat']).groupby(['lon', 'lat'], as_index=False)['value'].mean()
+    x, y = to_web_mercator(located['lon'], located['lat'])
+    return cached_surfaces(x, y, located['value'], bounds, resolution)[0]
 
-size_factor = 1  # Use your chosen size factor
 
-# Plot each station with its unique color
-for station in stations:
-    station_data = df[df['Station'] == station]
-    ax.scatter(
-        station_data['lon'], station_data['lat'],
-        s=station_data['Average Nitrates in 0-2 m (mg/L NO₃⁻) '].astype(float) * size_factor,
-        color=colors[station], alpha=0.6, edgecolors=colors[station], linewidths=1.5,
-        label=station
-    )
+def plot_nitrate_map(points, bounds, output='nitrate_station_map.png', size_factor=1, surface=None):
+    # All points in a single scatter with per-point colour and size arrays, so the cost no longer grows with
+    # one artist per station. Coordinates are projected to Web Mercator once, matching the basemap tiles.
+    x, y = to_web_mercator(points['lon'], points['lat'])
+    codes, stations = pd.factorize(points['Station'])
+    cmap = matplotlib.colormaps['tab20'].resampled(len(stations))
+    colors = cmap(codes)
+    sizes = points['value'].to_numpy(dtype=float) * size_factor
+    # Largest circles first so smaller ones stay visible on top
+    order = np.argsort(-sizes, kind='stable')
 
-# Dynamically zoom out to show all data and surroundings
-lon_min, lon_max = df['lon'].min(), df['lon'].max()
-lat_min, lat_max = df['lat'].min(), df['lat'].max()
-lon_buffer = (lon_max - lon_min) * 2.0  
-lat_buffer = (lat_max - lat_min) * 2.0
-ax.set_xlim(lon_min - lon_buffer, lon_max + lon_buffer)
-ax.set_ylim(lat_min - lat_buffer, lat_max + lat_buffer)
+    fig = new_figure(figsize=(12, 7))
+    ax = fig.subplots()
+    draw_basemap(ax, bounds)
+    if surface is not None:
+        image = draw_surface(ax, surface, bounds)
+        fig.colorbar(image, ax=ax, fraction=0.03, pad=0.01, label='Nitrates (mg/L NO₃⁻)')
+    ax.scatter(x[order], y[order], s=sizes[order], c=colors[order], alpha=0.6, edgecolors=colors[order],
+               linewidths=1.5, zorder=2)
 
-# Add OpenStreetMap background
-ctx.add_basemap(ax, crs='EPSG:4326', source=ctx.providers.OpenStreetMap.Mapnik)
- 
-# Remove axis ticks and frame for a clean look
-ax.set_xticks([])
-ax.set_yticks([])
-ax.set_frame_on(False)
+    # Create custom legend handles (small squares)
+    legend_handles = [Line2D([0], [0], marker='s', color='w', markerfacecolor=cmap(i), markeredgecolor=cmap(i),
+                             markersize=8, label=station, linestyle='')
+                      for i, station in enumerate(stations)]
+    ax.legend(handles=legend_handles, loc='upper right', bbox_to_anchor=(1.25, 1), title='Station', fontsize=8,
+              title_fontsize=10)
+    fig.tight_layout()
+    return save_figure(fig, output)
 
-# Create custom legend handles (small squares)
-legend_handles = [Line2D([0], [0], marker='s', color='w', markerfacecolor=colors[station],
-                         markeredgecolor=colors[station], markersize=8, label=station, linestyle='')
-                  for station in stations]
-ax.legend(handles=legend_handles, loc='upper right', bbox_to_anchor=(1.25, 1), title='Station', fontsize=8, title_fontsize=10)
 
-plt.tight_layout()
-plt.savefig('nitrate_station_map.png', dpi=300, bbox_inches='tight')
-plt.close() 
\ No newline at end of file
+def main(campaigns=False, surface=False, resolution=None):
+    circles = load_circle_data()
+    bounds = map_bounds(circles['lon'], circles['lat'])
+    if campaigns:
+        from groundwater_io import load_united_compact
+        points = campaign_points(circles, load_united_compact())
+        output = 'nitrate_station_map_campaigns.png'
+    else:
+        points = average_points(circles)
+        output = 'nitrate_station_map.png'
+    grid = None
+    if surface:
+        from idw_surface import DEFAULT_RESOLUTION
+        grid = nitrate_surface(points, bounds, resolution or DEFAULT_RESOLUTION)
+        output = output.replace('.png', '_idw.png')
+    output = plot_nitrate_map(points, bounds, output, surface=grid)
+    print(f"{len(points)} points plotted, map saved as '{output}'")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Nitrate concentrations at the stations over OpenStreetMap')
+    parser.add_argument('--campaigns', action='store_true',
+                        help='one point per station and monthly campaign from United.xlsx instead of the averages')
+    parser.add_argument('--surface', action='store_true', help='add an inverse-distance-weighted nitrate surface')
+    parser.add_argument('--resolution', type=int, help='surface cells along the longer side of the map')
+    args = parser.parse_args()
+    main(args.campaigns, args.surface, args.resolution)
+    flush_figures()
@@ -1,12 +1,13 @@
 import pandas as pd
-import matplotlib.pyplot as plt
+import matplotlib
 import numpy as np
 from matplotlib.dates import DateFormatter
-import re
 import os
+from figure_writer import flush_figures, new_figure, save_figure
 
-def create_station_plot(station_data, precip_data, station_name):
-    fig, ax1 = plt.subplots(figsize=(10, 6))
+def create_station_plot(station_data, precip_data, station_name, output=None, dpi=None):
+    fig = new_figure(figsize=(10, 6))
+    ax1 = fig.subplots()
     stations = station_data['station'].unique()
     ordered_stations = []
     for s in ['SS-' + station_name.split()[-1] + '-EX1', 'SS-' + station_name.split()[-1] + '-EX2']:
@@ -16,7 +17,7 @@ def create_station_plot(station_data, precip_data, station_name):
         s = f'SS-{station_name.split()[-1]}-0{i}'
         if s in stations:
             ordered_stations.append(s)
-    colors = plt.cm.nipy_spectral(np.linspace(0, 1, len(ordered_stations)))
+    colors = matplotlib.colormaps['nipy_spectral'](np.linspace(0, 1, len(ordered_stations)))
     for i, station in enumerate(ordered_stations):
         data = station_data[station_data['station'] == station].sort_values('Date')
         label = f"{station} ({data['Depths (m)'].iloc[0]} m)" if not data['Depths (m)'].isnull().all() else station
@@ -29,7 +30,7 @@ def create_station_plot(station_data, precip_data, station_name):
         max_date = station_data['Date'].max()
         ax1.set_xlim(min_date, max_date)
     ax1.xaxis.set_major_formatter(DateFormatter('%m/%Y'))
-    plt.xticks(rotation=30)
+    ax1.tick_params(axis='x', labelrotation=30)
     ax2 = ax1.twinx()
     ax2.bar(precip_data['Date & Time [UTC]'], precip_data['Precipitation'], width=2, color='black', alpha=0.18, label='Precipitation')
     ax2.set_ylabel('Rain (mm day$^{-1}$)', fontsize=12)
@@ -44,34 +45,37 @@ def create_station_plot(station_data, precip_data, station_name):
                          color=colors[i], fontsize=9, va='center', fontweight='bold')
     lines1, labels1 = ax1.get_legend_handles_labels()
     ax1.legend(lines1, labels1, loc='upper left', ncol=2, fontsize=9, frameon=False)
-    plt.title(f'Nitrites and Precipitation Time Series for {station_name}', fontsize=14, fontweight='bold')
-    plt.tight_layout()
-    os.makedirs('station_plots_nitrite', exist_ok=True)
-    plt.savefig(f'station_plots_nitrite/{station_name}_nitrite_precip.png', dpi=300, bbox_inches='tight')
-    plt.close()
+    ax1.set_title(f'Nitrites and Precipitation Time Series for {station_name}', fontsize=14, fontweight='bold')
+    fig.tight_layout()
+    if output is None:
+        os.makedirs('station_plots_nitrite', exist_ok=True)
+        output = f'station_plots_nitrite/{station_name}_nitrite_precip.png'
+    save_figure(fig, output, dpi=dpi)
 
-print('Loading data...')
-united = pd.read_excel('United.xlsx', header=1)
-precip = pd.read_excel('UZM_Precipitation_Combined-Climate data.xlsx')
-print('Data loaded.')
+if __name__ == '__main__':
+    print('Loading data...')
+    united = pd.read_excel('United.xlsx', header=1)
+    precip = pd.read_excel('UZM_Precipitation_Combined-Climate data.xlsx')
+    print('Data loaded.')
 
-united['Date'] = pd.to_datetime(united['Date'])
-precip['Date & Time [UTC]'] = pd.to_datetime(precip['Date & Time [UTC]'])
+    united['Date'] = pd.to_datetime(united['Date'])
+    precip['Date & Time [UTC]'] = pd.to_datetime(precip['Date & Time [UTC]'])
 
-united['Nitrites (mg/L NO₂⁻)'] = united['Nitrites (mg/L NO₂⁻)'].astype(str).str.replace('<', '', regex=False)
-united['Nitrites (mg/L NO₂⁻)'] = pd.to_numeric(united['Nitrites (mg/L NO₂⁻)'], errors='coerce')
-united = united.dropna(subset=['Nitrites (mg/L NO₂⁻)'])
+    united['Nitrites (mg/L NO₂⁻)'] = united['Nitrites (mg/L NO₂⁻)'].astype(str).str.replace('<', '', regex=False)
+    united['Nitrites (mg/L NO₂⁻)'] = pd.to_numeric(united['Nitrites (mg/L NO₂⁻)'], errors='coerce')
+    united = united.dropna(subset=['Nitrites (mg/L NO₂⁻)'])
 
-station_numbers = united['station'].str.extract(r'SS-(\d+)')[0].unique()
-print(f'Found station numbers: {station_numbers}')
+    station_numbers = united['station'].str.extract(r'SS-(\d+)')[0].unique()
+    print(f'Found station numbers: {station_numbers}')
 
-for station_num in station_numbers:
-    print(f'Processing station: {station_num}')
-    station_mask = united['station'].astype(str).str.match(f'SS-{station_num}-(0[1-9]|EX[12])')
-    station_data = united[station_mask]
-    print(f'  Data points for this station: {len(station_data)}')
-    if not station_data.empty:
-        create_station_plot(station_data, precip, f'Station {station_num}')
-        print(f'  Plot saved for Station {station_num}')
-    else:
-        print(f'  No data for Station {station_num}') 
\ No newline at end of file
+    for station_num in station_numbers:
+        print(f'Processing station: {station_num}')
+        station_mask = united['station'].astype(str).str.match(f'SS-{station_num}-(0[1-9]|EX[12])')
+        station_data = united[station_mask]
+        print(f'  Data points for this station: {len(station_data)}')
+        if not station_data.empty:
+            create_station_plot(station_data, precip, f'Station {station_num}')
+            print(f'  Plot saved for Station {station_num}')
+        else:
+            print(f'  No data for Station {station_num}')
+    flush_figures()
@@ -1,13 +1,21 @@
 import pandas as pd
-import matplotlib.pyplot as plt
+import matplotlib
 import numpy as np
 from matplotlib.dates import DateFormatter
-import re
 import os
+from figure_writer import flush_figures, new_figure, save_figure
+from logger_store import load_logger_mmap
+from logger_gaps import fill_frame
+from logger_pyramid import station_frames
 
-def create_station_plot(water_content_data, precip_data, station_num):
+def create_station_plot(water_content_data, precip_data, station_num, envelope=None, output=None, dpi=None):
     station_name = f'Station {station_num}'
-    fig, ax1 = plt.subplots(figsize=(10, 6))
+    # Short logger outages are interpolated; long ones get a NaN break so the lines do not bridge them
+    water_content_data = fill_frame(water_content_data)
+    if envelope is not None:
+        envelope = tuple(fill_frame(frame) for frame in envelope)
+    fig = new_figure(figsize=(10, 6))
+    ax1 = fig.subplots()
     
     # Get date range for plotting
     min_date = water_content_data['Time'].min()
@@ -19,7 +27,7 @@ def create_station_plot(water_content_data, precip_data, station_num):
     styles = ['-', '--', '-.', ':', '-', '--', '-.', ':', '-', '--', '-.']
     
     # Use different colors for water content lines
-    water_colors = plt.cm.nipy_spectral(np.linspace(0, 1, len(depths)))
+    water_colors = matplotlib.colormaps['nipy_spectral'](np.linspace(0, 1, len(depths)))
     
     # Map station identifiers based on column position rather than specific depth values
     station_ids = ['EX1', 'EX2', 'S01', 'S02', 'S03', 'S04', 'S05', 'S06', 'S07', 'S08', 'S09', 'S10']
@@ -36,6 +44,12 @@ def create_station_plot(water_content_data, precip_data, station_num):
                     linestyle=styles[i % len(styles)],
                     linewidth=2)
             
+            # Aggregated levels also carry the min/max of each bin
+            if envelope is not None:
+                low, high = envelope
+                ax1.fill_between(low['Time'], low[depth], high[depth],
+                                 color=water_colors[i], alpha=0.15, linewidth=0)
+            
             # Add text label directly on the line for the depth
             # Get last valid point for placing the label
             valid_data = water_content_data[depth].notna()
@@ -53,7 +67,7 @@ def create_station_plot(water_content_data, precip_data, station_num):
     ax1.set_ylim(bottom=0)
     
     ax1.xaxis.set_major_formatter(DateFormatter('%m/%Y'))
-    plt.xticks(rotation=30)
+    ax1.tick_params(axis='x', labelrotation=30)
     
     # RIGHT Y-axis shows precipitation data
     ax2 = ax1.twinx()
@@ -77,45 +91,43 @@ def create_station_plot(water_content_data, precip_data, station_num):
     if lines1:
         ax1.legend(lines1, labels1, loc='upper left', ncol=2, fontsize=9, frameon=False)
     
-    plt.title(f'Water Content and Precipitation Time Series for {station_name}', fontsize=14, fontweight='bold')
-    plt.tight_layout()
+    ax1.set_title(f'Water Content and Precipitation Time Series for {station_name}', fontsize=14, fontweight='bold')
+    fig.tight_layout()
     
-    os.makedirs('station_plots_water_content_2', exist_ok=True)
-    output_file = f'station_plots_water_content_2/station_{station_num}_water_content_precip.png'
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
-    print(f"  Plot saved to {output_file}")
-    plt.close()
+    if output is None:
+        os.makedirs('station_plots_water_content_2', exist_ok=True)
+        output = f'station_plots_water_content_2/station_{station_num}_water_content_precip.png'
+    output = save_figure(fig, output, dpi=dpi)
+    print(f"  Plot saved to {output}")
 
-print('Loading data...')
-water_content = pd.read_csv('1.csv')
-precip = pd.read_excel('UZM_Precipitation_Combined-Climate data.xlsx')
-print('Data loaded.')
+if __name__ == '__main__':
+    print('Loading data...')
+    water_content = load_logger_mmap(1)
+    precip = pd.read_excel('UZM_Precipitation_Combined-Climate data.xlsx')
+    print('Data loaded.')
 
-water_content['Time'] = pd.to_datetime(water_content['Time'], format='%d/%m/%Y %H:%M')
-precip['Date & Time [UTC]'] = pd.to_datetime(precip['Date & Time [UTC]'])
+    precip['Date & Time [UTC]'] = pd.to_datetime(precip['Date & Time [UTC]'])
 
-print(f"Water content data date range: {water_content['Time'].min()} to {water_content['Time'].max()}")
-print(f"Precipitation data date range: {precip['Date & Time [UTC]'].min()} to {precip['Date & Time [UTC]'].max()}")
+    print(f"Water content data date range: {water_content['Time'].min()} to {water_content['Time'].max()}")
+    print(f"Precipitation data date range: {precip['Date & Time [UTC]'].min()} to {precip['Date & Time [UTC]'].max()}")
 
-# Process for each CSV file (1.csv to 16.csv for different stations)
-for station_num in range(1, 17):
-    print(f'Processing station: {station_num}')
-    # Check if this station's data file exists
-    if station_num == 1:
-        # We already loaded station 1 data
-        station_data = water_content
-    else:
+    # Process for each CSV file (1.csv to 16.csv for different stations)
+    for station_num in range(1, 17):
+        print(f'Processing station: {station_num}')
+        # Check if this station's data file exists
         try:
-            station_data = pd.read_csv(f'{station_num}.csv')
-            station_data['Time'] = pd.to_datetime(station_data['Time'], format='%d/%m/%Y %H:%M')
+            # Coarsest precomputed level that still fills the figure width
+            station_data, low, high = station_frames(station_num)
             print(f'  Loaded data for Station {station_num}')
         except FileNotFoundError:
             print(f'  No data file found for Station {station_num}')
             continue
     
-    print(f'  Data points for Station {station_num}: {len(station_data)}')
-    if not station_data.empty:
-        create_station_plot(station_data, precip, station_num)
-        print(f'  Processing complete for Station {station_num}')
-    else:
-        print(f'  No data for Station {station_num}') 
\ No newline at end of file
+        print(f'  Data points for Station {station_num}: {len(station_data)}')
+        if not station_data.empty:
+            create_station_plot(station_data, precip, station_num,
+                                envelope=None if low is None else (low, high))
+            print(f'  Processing complete for Station {station_num}')
+        else:
+            print(f'  No data for Station {station_num}')
+    flush_figures()
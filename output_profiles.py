@@ -0,0 +1,53 @@
+import os
+
+PROFILE_ENV = 'GROUNDWATER_OUTPUT_PROFILE'
+RASTER_FORMATS = ('png', 'webp')
+# Lines with more points than this, and axes with more patches than this, are rasterised in vector output
+DENSE_POINTS = 500
+
+PROFILES = {
+    # What the scripts have always written: 300 dpi PNG cropped to the tight bounding box
+    'default': {'format': 'png', 'dpi': 300, 'tight': True, 'pil_kwargs': {}},
+    # Quick checks: low dpi, no tight-bbox pass, fastest zlib level
+    'draft': {'format': 'png', 'dpi': 72, 'tight': False, 'pil_kwargs': {'compress_level': 1}},
+    # Publication PNG: same pixels as default, smallest lossless encoding
+    'png': {'format': 'png', 'dpi': 300, 'tight': True, 'pil_kwargs': {'optimize': True}},
+    'webp': {'format': 'webp', 'dpi': 300, 'tight': True, 'pil_kwargs': {'quality': 90, 'method': 6}},
+    # Vector output; dpi applies to the rasterised scatter/line/bar layers only
+    'svg': {'format': 'svg', 'dpi': 200, 'tight': True, 'rasterize': True},
+    'pdf': {'format': 'pdf', 'dpi': 200, 'tight': True, 'rasterize': True},
+}
+
+_active = None
+
+
+def set_output_profile(name):
+    global _active
+    if name not in PROFILES:
+        raise ValueError(f'unknown output profile {name!r}, choose from {", ".join(PROFILES)}')
+    _active = name
+
+
+def active_profile():
+    name = _active or os.environ.get(PROFILE_ENV, 'default')
+    if name not in PROFILES:
+        raise ValueError(f'{PROFILE_ENV}={name!r} is not one of {", ".join(PROFILES)}')
+    return PROFILES[name]
+
+
+def output_path(path, profile):
+    root, ext = os.path.splitext(os.fspath(path))
+    return f"{root}.{profile['format']}" if ext.lower() == '.png' else os.fspath(path)
+
+
+def rasterize_dense_layers(fig, threshold=DENSE_POINTS):
+    # Keeps axes, labels and text as vectors while dense data layers become a single image each
+    for ax in fig.axes:
+        for collection in ax.collections:
+            collection.set_rasterized(True)
+        for line in ax.lines:
+            if len(line.get_xdata()) > threshold:
+                line.set_rasterized(True)
+        if len(ax.patches) > threshold:
+            for patch in ax.patches:
+                patch.set_rasterized(True)
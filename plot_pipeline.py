@@ -0,0 +1,233 @@
+import argparse
+import hashlib
+import importlib
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from depth_profiles import date_scale, plot_depth_relationship, site_slices
+from figure_writer import flush_figures
+from groundwater_io import (ANALYTES, PRECIP_FILE, STATION_NUMBERS, UNITED_FILE, daily_precip, dual_axis_frame,
+                            file_digest, load_precip, load_united_compact, station_code)
+
+CACHE_DIR = 'pipeline_cache'
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+JOB_KINDS = ['depth', 'small-multiples', 'panels', 'heatmap', 'nitrate', 'nitrite', 'water-content']
+
+# Shared intermediates: (input files, intermediate dependencies, builder, kept on disk between runs)
+INTERMEDIATES = {
+    'united': ([UNITED_FILE], [], load_united_compact, True),
+    'slices': ([], ['united'], site_slices, False),
+    'date_scale': ([], ['united'], lambda united: date_scale(united['Date']), False),
+    'precip': ([PRECIP_FILE], [], lambda: daily_precip(load_precip()), True),
+    'nitrate': ([], ['united'], lambda united: dual_axis_frame(united, 'nitrate'), True),
+    'nitrite': ([], ['united'], lambda united: dual_axis_frame(united, 'nitrite'), True),
+}
+
+
+def load_spec(path):
+    # jobs: [{kind: depth, analytes: [no3, cl], stations: [SS-07], output: 'plots/{analyte}_{station}.png'}, ...]
+    if path.lower().endswith('.toml'):
+        import tomllib
+        with open(path, 'rb') as f:
+            spec = tomllib.load(f)
+    else:
+        import yaml
+        with open(path, encoding='utf-8') as f:
+            spec = yaml.safe_load(f) or {}
+    jobs = spec.get('jobs')
+    if not jobs:
+        raise ValueError(f"{path}: no jobs defined")
+    for i, job in enumerate(jobs):
+        if job.get('kind') not in JOB_KINDS:
+            raise ValueError(f"{path}: job {i} has kind {job.get('kind')!r}, expected one of {', '.join(JOB_KINDS)}")
+        unknown = sorted(set(job.get('analytes') or []) - set(ANALYTES))
+        if unknown:
+            raise ValueError(f"{path}: job {i} has unknown analyte(s) {', '.join(unknown)}")
+    return spec
+
+
+def _united_stations(job):
+    stations = job.get('stations') or [station_code(n) for n in STATION_NUMBERS]
+    return [station_code(s) if str(s).isdigit() else str(s) for s in stations]
+
+
+def _station_numbers(job):
+    return [int(str(s).split('-')[-1]) for s in job.get('stations') or STATION_NUMBERS]
+
+
+def _output(job, **fields):
+    return job['output'].format(kind=job['kind'], **fields) if job.get('output') else None
+
+
+def expand_job(job):
+    # One leaf per figure: (label, intermediates it reads, fn(values))
+    kind = job['kind']
+    keys = job.get('analytes') or list(ANALYTES)
+    leaves = []
+    if kind == 'depth':
+        for key in keys:
+            for station in _united_stations(job):
+                output = _output(job, analyte=key, station=station)
+                leaves.append((f'depth {key} {station}', ['united', 'slices', 'date_scale'],
+                               lambda v, key=key, station=station, output=output: plot_depth_relationship(
+                                   station, v['slices'].get(station, v['united'].iloc[:0]), key, output=output,
+                                   scale=v['date_scale'])))
+    elif kind == 'small-multiples':
+        from depth_small_multiples import plot_analyte_grid
+        for key in keys:
+            output = _output(job, analyte=key, station='all')
+            leaves.append((f'small-multiples {key}', ['united', 'date_scale'],
+                           lambda v, key=key, output=output: plot_analyte_grid(v['united'], key, output=output,
+                                                                               scale=v['date_scale'])))
+    elif kind == 'panels':
+        from station_panels import plot_station_panels
+        for station in _united_stations(job):
+            output = _output(job, analyte='all', station=station)
+            leaves.append((f'panels {station}', ['slices', 'date_scale'],
+                           lambda v, station=station, output=output: _plot_panels(
+                               plot_station_panels, v['slices'], station, job.get('analytes'), output,
+                               v['date_scale'])))
+    elif kind == 'heatmap':
+        from depth_time_heatmap import plot_united_heatmaps
+        for key in keys:
+            leaves.append((f'heatmap {key}', ['united'], lambda v, key=key: plot_united_heatmaps(v['united'], key)))
+    elif kind in ('nitrate', 'nitrite'):
+        module = importlib.import_module(f'{kind}_precip_dual_axis')
+        for station_num in _station_numbers(job):
+            number = f'{station_num:02d}'
+            output = _output(job, analyte=kind, station=station_code(station_num))
+            leaves.append((f'{kind} {station_code(station_num)}', [kind, 'precip'],
+                           lambda v, kind=kind, number=number, output=output: _plot_dual_axis(
+                               module, v[kind], v['precip'], number, output)))
+    else:
+        module = importlib.import_module('water_content_precip_dual_axis')
+        for station_num in _station_numbers(job):
+            output = _output(job, analyte='water_content', station=station_code(station_num))
+            leaves.append((f'water-content {station_num}', ['precip'],
+                           lambda v, station_num=station_num, output=output: _plot_water_content(
+                               module, v['precip'], station_num, output)))
+    return leaves
+
+
+def _plot_panels(plot_station_panels, slices, station, keys, output, scale):
+    if station not in slices:
+        print(f"No valid data found for {station} stations")
+        return None
+    return plot_station_panels(slices[station], station, keys, output=output, scale=scale)
+
+
+def _plot_dual_axis(module, frame, precip, number, output):
+    station_data = frame[frame['station'].astype(str).str.match(f'SS-{number}-(0[1-9]|EX[12])')]
+    if station_data.empty:
+        print(f'  No data for Station {number}')
+        return None
+    return module.create_station_plot(station_data, precip, f'Station {number}', output=output)
+
+
+def _plot_water_content(module, precip, station_num, output):
+    from logger_pyramid import station_frames
+    try:
+        station_data, low, high = station_frames(station_num)
+    except FileNotFoundError:
+        print(f'  No data file found for Station {station_num}')
+        return None
+    if station_data.empty:
+        return None
+    return module.create_station_plot(station_data, precip, station_num,
+                                      envelope=None if low is None else (low, high), output=output)
+
+
+class Pipeline:
+    # Builds each intermediate once per run (and reuses the on-disk copy while its inputs are unchanged),
+    # then renders the figure leaves on a thread pool
+    def __init__(self, cache_dir=CACHE_DIR, workers=DEFAULT_WORKERS):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.values = {}
+        self.keys = {}
+        self._lock = threading.Lock()
+
+    def key(self, name):
+        # Content hash of the node's input files and of every intermediate it is derived from
+        if name not in self.keys:
+            files, deps = INTERMEDIATES[name][:2]
+            parts = [name] + [file_digest(path) for path in files] + [self.key(dep) for dep in deps]
+            self.keys[name] = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+        return self.keys[name]
+
+    def build(self, name):
+        files, deps, builder, persist = INTERMEDIATES[name]
+        path = os.path.join(self.cache_dir, f'{name}_{self.key(name)[:16]}.pkl')
+        if persist and os.path.exists(path):
+            print(f'Loaded {name} from cache')
+            value = pd.read_pickle(path)
+        else:
+            print(f'Building {name}...')
+            value = builder(*[self.values[dep] for dep in deps])
+            if persist:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                pd.to_pickle(value, f'{path}.tmp', compression=None)
+                os.replace(f'{path}.tmp', path)
+        with self._lock:
+            self.values[name] = value
+
+    def _waves(self, names):
+        # Intermediates grouped by depth in the graph; everything in one wave is independent
+        needed, stack = set(), list(names)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(INTERMEDIATES[name][1])
+        depth = {}
+
+        def level(name):
+            if name not in depth:
+                depth[name] = 1 + max((level(dep) for dep in INTERMEDIATES[name][1]), default=-1)
+            return depth[name]
+        waves = {}
+        for name in needed:
+            waves.setdefault(level(name), []).append(name)
+        return [sorted(waves[i]) for i in sorted(waves)]
+
+    def _run_leaf(self, leaf):
+        label, _, fn = leaf
+        try:
+            fn(self.values)
+            return None
+        except Exception as exc:
+            print(f'{label} failed: {exc!r}')
+            return label
+
+    def run(self, jobs):
+        leaves = [leaf for job in jobs for leaf in expand_job(job)]
+        print(f'{len(leaves)} figures from {len(jobs)} jobs')
+        with ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix='plot-job') as pool:
+            waves = self._waves({dep for _, deps, _ in leaves for dep in deps})
+            # Input files are hashed once, up front, before any worker needs a key
+            for name in sum(waves, []):
+                self.key(name)
+            for wave in waves:
+                list(pool.map(self.build, [name for name in wave if name not in self.values]))
+            failed = [label for label in pool.map(self._run_leaf, leaves) if label]
+        # The leaves only queue their PNGs; a write that fails in the background fails the run too
+        try:
+            flush_figures()
+        except Exception as exc:
+            print(f'figure writes failed: {exc!r}')
+            failed.append('figure writes')
+        print(f'{len(leaves) - len(failed)} of {len(leaves)} figures rendered')
+        return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render the plot jobs listed in a YAML or TOML spec')
+    parser.add_argument('spec', help='job spec (.yaml, .yml or .toml)')
+    parser.add_argument('--workers', type=int, help=f'parallel builds and renders (default: spec or {DEFAULT_WORKERS})')
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args()
+    spec = load_spec(args.spec)
+    pipeline = Pipeline(args.cache_dir, args.workers or spec.get('workers', DEFAULT_WORKERS))
+    sys.exit(1 if pipeline.run(spec['jobs']) else 0)
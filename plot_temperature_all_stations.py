@@ -1,13 +1,14 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.dates import DateFormatter
+from figure_writer import flush_figures, save_figure
 
 # File and sheet names
 excel_file = 'UZM_Precipitation_Combined - 22_05_2025.xlsx'
 sheets = ['Selmun', 'Valletta', 'Zebbug', 'Luqa']
 colors = ['tab:blue', 'tab:orange', 'tab:green', 'tab:red']
 
-plt.figure(figsize=(14, 7))
+fig = plt.figure(figsize=(14, 7))
 
 for sheet, color in zip(sheets, colors):
     df = pd.read_excel(excel_file, sheet_name=sheet)
@@ -35,5 +36,6 @@ plt.grid(True, linestyle='--', alpha=0.5)
 plt.gca().xaxis.set_major_formatter(DateFormatter('%d.%m.%Y'))
 plt.xticks(rotation=30)
 plt.tight_layout()
-plt.savefig('mean_temperature_all_stations.png', dpi=300)
+save_figure(fig, 'mean_temperature_all_stations.png', tight=False, close=False)
+flush_figures()
 plt.show() 
\ No newline at end of file
@@ -0,0 +1,231 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import pandas as pd
+from depth_profiles import site_codes
+from groundwater_io import (ANALYTES, PRECIP_FILE, STATION_NUMBERS, UNITED_FILE, daily_precip, load_precip,
+                            load_united_compact)
+from logger_store import load_logger_mmap
+from plot_pipeline import DEFAULT_WORKERS, Pipeline
+
+STATE_FILE = 'watch_state.json'
+POLL_INTERVAL = 2.0
+# Seconds without further writes before a burst of changes is processed
+DEBOUNCE = 5.0
+WATCH_KINDS = ['depth', 'panels', 'small-multiples', 'heatmap', 'nitrate', 'nitrite', 'water-content']
+DEFAULT_KINDS = ['depth', 'nitrate', 'nitrite', 'water-content']
+
+
+def watched_files():
+    return [UNITED_FILE, PRECIP_FILE] + [f'{n}.csv' for n in STATION_NUMBERS]
+
+
+def snapshot(paths):
+    signatures = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signatures[path] = [stat.st_size, stat.st_mtime_ns]
+        except FileNotFoundError:
+            signatures[path] = None
+    return signatures
+
+
+def united_digests(united):
+    # One digest per site over its rows, so an edit to one station's samples only touches that station
+    row_hashes = pd.util.hash_pandas_object(united.astype(str), index=False)
+    return {site: hashlib.sha1(hashes.to_numpy().tobytes()).hexdigest()
+            for site, hashes in row_hashes.groupby(site_codes(united).to_numpy())}
+
+
+def precip_days(precip):
+    return {day.strftime('%Y-%m-%d'): float(value) for day, value in
+            zip(precip['Date & Time [UTC]'], precip['Precipitation'])}
+
+
+def _changed(old, new):
+    return sorted(key for key in set(old) | set(new) if old.get(key) != new.get(key))
+
+
+def _overlaps(start, end, window):
+    return pd.notna(start) and start <= window[1] and end >= window[0]
+
+
+class Watcher:
+    # Polls the input files, compares each changed file with the parse recorded in the state file and
+    # queues only the figures that depend on the stations or dates that actually changed
+    def __init__(self, kinds=DEFAULT_KINDS, analytes=None, workers=DEFAULT_WORKERS, state_file=STATE_FILE,
+                 interval=POLL_INTERVAL, debounce=DEBOUNCE):
+        self.kinds = kinds
+        self.analytes = analytes
+        self.workers = workers
+        self.state_file = state_file
+        self.interval = interval
+        self.debounce = debounce
+        self.united = None
+        self.precip = None
+        self.state = self._read_state()
+
+    def _read_state(self):
+        try:
+            with open(self.state_file, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_state(self):
+        tmp_path = f'{self.state_file}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_file)
+
+    def _load_united(self):
+        self.united = load_united_compact() if os.path.exists(UNITED_FILE) else None
+        return {} if self.united is None else united_digests(self.united)
+
+    def _load_precip(self):
+        self.precip = daily_precip(load_precip()) if os.path.exists(PRECIP_FILE) else None
+        return {} if self.precip is None else precip_days(self.precip)
+
+    def baseline(self):
+        print('Recording baseline...')
+        self.state = {'files': snapshot(watched_files()), 'united': self._load_united(),
+                      'precip': self._load_precip()}
+        self._write_state()
+
+    def wait_for_changes(self):
+        # Blocks until some file differs from the recorded state and then stays unchanged for `debounce` seconds
+        last = snapshot(watched_files())
+        quiet_since = time.monotonic()
+        while True:
+            current = snapshot(watched_files())
+            if current != last:
+                last, quiet_since = current, time.monotonic()
+            elif _changed(self.state['files'], current) and time.monotonic() - quiet_since >= self.debounce:
+                return current
+            time.sleep(self.interval)
+
+    def affected_jobs(self, files):
+        # Returns the jobs and the state to record once they have rendered; self.state is left as it is
+        changed = _changed(self.state['files'], files)
+        state = dict(self.state)
+        sites, numbers, loggers = set(), set(), set()
+        if UNITED_FILE in changed:
+            digests = self._load_united()
+            sites = set(_changed(self.state['united'], digests))
+            numbers |= {int(site.split('-')[-1]) for site in sites}
+            print(f"{UNITED_FILE}: {', '.join(sorted(sites)) or 'no station'} changed")
+            state['united'] = digests
+        if PRECIP_FILE in changed:
+            days = self._load_precip()
+            changed_days = _changed(self.state['precip'], days)
+            if changed_days:
+                window = (pd.Timestamp(changed_days[0]), pd.Timestamp(changed_days[-1]) + pd.Timedelta(days=1))
+                print(f'{PRECIP_FILE}: {len(changed_days)} day(s) changed between {changed_days[0]} and {changed_days[-1]}')
+                numbers |= self._united_stations_in(window)
+                loggers |= self._logger_stations_in(window)
+            state['precip'] = days
+        for station_num in STATION_NUMBERS:
+            if f'{station_num}.csv' in changed and files[f'{station_num}.csv'] is not None:
+                loggers.add(station_num)
+        if loggers:
+            print(f"Logger exports changed for station(s) {', '.join(map(str, sorted(loggers)))}")
+        state['files'] = files
+        return self._jobs(sorted(sites), sorted(numbers), sorted(loggers)), state
+
+    def _united_stations_in(self, window):
+        if self.united is None:
+            return set()
+        spans = self.united.groupby(site_codes(self.united))['Date'].agg(['min', 'max'])
+        return {int(site.split('-')[-1]) for site, (start, end) in spans.iterrows() if _overlaps(start, end, window)}
+
+    def _logger_stations_in(self, window):
+        stations = set()
+        for station_num in STATION_NUMBERS:
+            try:
+                times = load_logger_mmap(station_num)['Time']
+            except FileNotFoundError:
+                continue
+            if len(times) and _overlaps(times.iloc[0], times.iloc[-1], window):
+                stations.add(station_num)
+        return stations
+
+    def _jobs(self, sites, numbers, loggers):
+        jobs = []
+        analytes = self.analytes or list(ANALYTES)
+        for kind in self.kinds:
+            if kind in ('depth', 'panels') and sites:
+                jobs.append({'kind': kind, 'analytes': analytes, 'stations': sites})
+            elif kind in ('small-multiples', 'heatmap') and sites:
+                jobs.append({'kind': kind, 'analytes': analytes})
+            elif kind in ('nitrate', 'nitrite') and numbers:
+                jobs.append({'kind': kind, 'stations': numbers})
+            elif kind == 'water-content' and loggers:
+                jobs.append({'kind': kind, 'stations': loggers})
+        return jobs
+
+    def render(self, jobs):
+        pipeline = Pipeline(workers=self.workers)
+        # The watcher's own parse is reused instead of reading the workbooks a second time
+        if self.united is not None:
+            pipeline.values['united'] = self.united
+        if self.precip is not None:
+            pipeline.values['precip'] = self.precip
+        return pipeline.run(jobs)
+
+    def run(self, once=False):
+        if self.state is None:
+            self.baseline()
+        else:
+            # Files that changed while nobody was watching are parsed by affected_jobs below
+            pending = _changed(self.state['files'], snapshot(watched_files()))
+            if UNITED_FILE not in pending:
+                self._load_united()
+            if PRECIP_FILE not in pending:
+                self._load_precip()
+        print(f'Watching {UNITED_FILE}, {PRECIP_FILE} and station logger exports (Ctrl+C to stop)')
+        while True:
+            files = snapshot(watched_files())
+            if not _changed(self.state['files'], files):
+                if once:
+                    return []
+                files = self.wait_for_changes()
+            jobs, state = self.affected_jobs(files)
+            failed = self.render(jobs) if jobs else []
+            if not jobs:
+                print('No figures affected')
+            if failed:
+                # The change is not recorded, so its figures are rendered again on the next poll
+                print(f'{len(failed)} figure(s) failed; retrying on the next poll')
+                if once:
+                    return failed
+                time.sleep(self.interval)
+                continue
+            self.state = state
+            self._write_state()
+            if once:
+                return []
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Re-render only the figures affected by changed input files')
+    parser.add_argument('analytes', nargs='*', metavar='analyte', help='analytes for depth figures (default: all)')
+    parser.add_argument('--kinds', nargs='+', default=DEFAULT_KINDS, help=f'figure kinds: {", ".join(WATCH_KINDS)}')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help='seconds between polls')
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE, help='quiet seconds before rendering')
+    parser.add_argument('--once', action='store_true', help='process pending changes and exit')
+    args = parser.parse_args()
+    unknown = sorted(set(args.analytes) - set(ANALYTES)) + sorted(set(args.kinds) - set(WATCH_KINDS))
+    if unknown:
+        parser.error(f'unknown analyte(s) or kind(s): {", ".join(unknown)}')
+    watcher = Watcher(args.kinds, args.analytes, args.workers, interval=args.interval, debounce=args.debounce)
+    try:
+        failed = watcher.run(once=args.once)
+    except KeyboardInterrupt:
+        print('Stopped watching')
+    else:
+        sys.exit(1 if failed else 0)
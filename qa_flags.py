@@ -0,0 +1,115 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from groundwater_io import ANALYTES, UNITED_FILE, file_digest, load_united, normalise_united
+
+QA_DIR = 'qa_cache'
+QA_REPORT_FILE = 'united_qa_flags.csv'
+# Samples per (site, sensor, analyte) window, centred on the sample being checked
+ROLLING_WINDOW = 7
+MIN_PERIODS = 3
+# Robust z-score (0.6745 * |x - median| / MAD) above which a sample is a spike
+OUTLIER_Z = 3.5
+# MAD never taken below this fraction of the rolling median, so flat series do not flag rounding noise
+MAD_FLOOR = 0.01
+EC_TOLERANCE = 0.25
+PH_TOLERANCE = 0.5
+IONIC_BALANCE_LIMIT = 10.0
+# Analytes a failed cross-check casts doubt on
+CROSS_CHECKS = {
+    'qa_ec_mismatch': ['ec', 'lab_conductivity'],
+    'qa_ph_mismatch': ['ph', 'lab_ph'],
+    'qa_ionic_balance': ['ca', 'mg', 'na', 'k', 'total_alk', 'cl', 'so4', 'no3', 'ionic_balance'],
+}
+
+
+def _rolling_median(values, keys):
+    rolled = values.groupby(keys, sort=False).rolling(ROLLING_WINDOW, center=True, min_periods=MIN_PERIODS).median()
+    return rolled.reset_index(level=list(range(len(keys))), drop=True).reindex(values.index)
+
+
+def outlier_flags(normalised):
+    # Hampel filter per (site, sensor, analyte) on the date-ordered series: one long frame, grouped rolling medians
+    names = [analyte['name'] for analyte in ANALYTES.values()]
+    long = normalised.assign(sensor=normalised['sensor'].fillna(''), row=normalised.index).melt(
+        id_vars=['row', 'site', 'sensor', 'Date'], value_vars=names, var_name='analyte')
+    long = long.dropna(subset=['value', 'Date']).sort_values(['site', 'sensor', 'analyte', 'Date'])
+    long = long.reset_index(drop=True)
+    keys = [long['site'], long['sensor'], long['analyte']]
+    median = _rolling_median(long['value'], keys)
+    deviation = (long['value'] - median).abs()
+    mad = np.maximum(_rolling_median(deviation, keys), MAD_FLOOR * median.abs())
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(mad > 0, 0.6745 * deviation / mad, 0.0)
+    long['outlier'] = np.nan_to_num(z) > OUTLIER_Z
+    flags = long.pivot(index='row', columns='analyte', values='outlier')
+    flags = flags.reindex(index=normalised.index, columns=names).fillna(False).astype(bool)
+    return flags.add_suffix('_outlier')
+
+
+def cross_check_flags(normalised):
+    ec, lab_ec = normalised[ANALYTES['ec']['name']], normalised[ANALYTES['lab_conductivity']['name']]
+    ph, lab_ph = normalised[ANALYTES['ph']['name']], normalised[ANALYTES['lab_ph']['name']]
+    balance = normalised[ANALYTES['ionic_balance']['name']]
+    return pd.DataFrame({
+        'qa_ec_mismatch': (ec - lab_ec).abs() > EC_TOLERANCE * lab_ec.abs(),
+        'qa_ph_mismatch': (ph - lab_ph).abs() > PH_TOLERANCE,
+        'qa_ionic_balance': balance.abs() > IONIC_BALANCE_LIMIT,
+    }, index=normalised.index)
+
+
+def compute_flags(united):
+    # One boolean column per check, aligned with the rows of United
+    normalised = normalise_united(united)
+    flags = pd.concat([outlier_flags(normalised), cross_check_flags(normalised)], axis=1)
+    flags['qa_any'] = flags.any(axis=1)
+    return flags
+
+
+def united_flags(united=None, path=UNITED_FILE, qa_dir=QA_DIR):
+    # Flags are computed once per version of the workbook and read back from qa_cache/ afterwards;
+    # united, when given, must be the unfiltered parse of path
+    cache_path = os.path.join(qa_dir, f'flags_{file_digest(path)[:16]}.parquet')
+    if os.path.exists(cache_path):
+        flags = pd.read_parquet(cache_path)
+        if united is not None:
+            flags.index = united.index
+        return flags
+    flags = compute_flags(load_united(path) if united is None else united)
+    os.makedirs(qa_dir, exist_ok=True)
+    flags.reset_index(drop=True).to_parquet(f'{cache_path}.tmp')
+    os.replace(f'{cache_path}.tmp', cache_path)
+    return flags
+
+
+def rejected(flags, key):
+    # Rows whose value for this analyte should not be plotted
+    mask = flags[f"{ANALYTES[key]['name']}_outlier"].copy()
+    for check, keys in CROSS_CHECKS.items():
+        if key in keys:
+            mask |= flags[check]
+    return mask
+
+
+def apply_flags(united, flags, keys=None):
+    # Copy of United (raw or compact) with flagged values blanked, so every plotter skips them
+    united = united.copy()
+    for key in keys or ANALYTES:
+        column = key if key in united.columns else ANALYTES[key]['column']
+        position = column if isinstance(column, int) else united.columns.get_loc(column)
+        mask = rejected(flags, key).to_numpy()
+        united.iloc[mask, position] = np.nan
+    return united
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Flag outliers and inconsistent samples in United.xlsx')
+    parser.add_argument('--output', default=QA_REPORT_FILE)
+    args = parser.parse_args()
+    united = load_united()
+    flags = united_flags(united)
+    print(flags.sum().loc[lambda counts: counts > 0].to_string())
+    report = pd.concat([united[['station', 'Date']], flags], axis=1)[flags['qa_any']]
+    report.to_csv(args.output, index=False)
+    print(f"{len(report)} flagged samples saved as '{args.output}'")
@@ -0,0 +1,232 @@
+import matplotlib
+matplotlib.use('Agg')
+
+import argparse
+import hashlib
+import importlib
+import io
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pandas as pd
+from groundwater_io import (ANALYTES, DUAL_AXIS_COLUMNS, PRECIP_FILE, UNITED_FILE, dual_axis_frame, load_precip,
+                            load_united_compact, station_code)
+from depth_profiles import date_scale, depth_plot_function
+from logger_pyramid import station_frames
+from logger_store import keyed_lock
+
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+MAX_DPI = 600
+
+
+class FigureCache:
+    # LRU of rendered PNG bytes, bounded by total size rather than entry count
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.size -= len(self._items.pop(key))
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._items), 'bytes': self.size, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+        return [path, stat.st_size, stat.st_mtime_ns]
+    except FileNotFoundError:
+        return [path, None, None]
+
+
+class RenderService:
+    # Keeps the parsed inputs in memory and reloads them only when the files on disk change
+    def __init__(self, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.cache = FigureCache(cache_bytes)
+        self._data_lock = threading.Lock()
+        self._signature = None
+        self._data = None
+        self._loggers = {}
+
+    def data(self):
+        signature = [_file_signature(UNITED_FILE), _file_signature(PRECIP_FILE)]
+        with self._data_lock:
+            if signature != self._signature:
+                print('Loading data...')
+                united = load_united_compact()
+                dual_axis = {kind: dual_axis_frame(united, kind) for kind in DUAL_AXIS_COLUMNS}
+                # Depth figures colour dates on the full dataset's scale, whatever start/end a request selects
+                self._data = {'united': united, 'dual_axis': dual_axis, 'precip': load_precip(),
+                              'date_scale': date_scale(united['Date'])}
+                self._signature = signature
+                print('Data loaded.')
+            return self._data, self._signature
+
+    def logger_frames(self, station_num, signature):
+        # (mean, min, max) logger frames per station, refreshed only when the station's CSV changes
+        with keyed_lock(id(self), station_num):
+            cached = self._loggers.get(station_num)
+            if cached is None or cached[0] != signature:
+                cached = (signature, station_frames(station_num))
+                self._loggers[station_num] = cached
+            return cached[1]
+
+    def render(self, params):
+        kind = params.get('kind', 'depth')
+        # 'SS-07', '07' and '7' name the same station for every kind
+        match = re.fullmatch(r'(?:SS-)?(\d+)', params.get('station', '').strip(), flags=re.IGNORECASE)
+        if match is None:
+            raise ValueError('station is required, e.g. SS-07 or 7')
+        station_num = int(match.group(1))
+        analyte = params.get('analyte')
+        start = pd.Timestamp(params['start']) if params.get('start') else None
+        end = pd.Timestamp(params['end']) if params.get('end') else None
+        dpi = int(params.get('dpi', 300))
+        if not 10 <= dpi <= MAX_DPI:
+            raise ValueError(f'dpi must be between 10 and {MAX_DPI}')
+        if kind == 'depth' and analyte not in ANALYTES:
+            raise ValueError(f'analyte must be one of {", ".join(ANALYTES)}')
+        if kind not in ('depth', 'water_content', *DUAL_AXIS_COLUMNS):
+            raise ValueError(f'unknown kind {kind!r}')
+
+        data, signature = self.data()
+        if kind == 'water_content':
+            signature = signature + [_file_signature(f'{station_num}.csv')]
+        key = hashlib.sha1(json.dumps([kind, station_num, analyte, str(start), str(end), dpi, signature]).encode()).hexdigest()
+        png = self.cache.get(key)
+        if png is not None:
+            return png, True
+
+        buffer = io.BytesIO()
+        # Every renderer draws on its own Figure, so request threads render concurrently
+        if kind == 'depth':
+            self._render_depth(data, station_num, analyte, start, end, dpi, buffer)
+        elif kind == 'water_content':
+            self._render_water_content(data, station_num, signature[-1], start, end, dpi, buffer)
+        else:
+            self._render_dual_axis(data, kind, station_num, start, end, dpi, buffer)
+        png = buffer.getvalue()
+        if png:
+            self.cache.put(key, png)
+        return png, False
+
+    @staticmethod
+    def _in_range(frame, column, start, end):
+        mask = pd.Series(True, index=frame.index)
+        if start is not None:
+            mask &= frame[column] >= start
+        if end is not None:
+            mask &= frame[column] <= end
+        return frame[mask]
+
+    def _render_depth(self, data, station_num, key, start, end, dpi, buffer):
+        df = self._in_range(data['united'], 'Date', start, end)
+        depth_plot_function(key)(station_code(station_num), df, output=buffer, dpi=dpi, scale=data['date_scale'])
+
+    def _render_dual_axis(self, data, kind, station_num, start, end, dpi, buffer):
+        module = importlib.import_module(f'{kind}_precip_dual_axis')
+        united = self._in_range(data['dual_axis'][kind], 'Date', start, end)
+        station_data = united[united['station'].astype(str).str.match(f'SS-0*{station_num}-(0[1-9]|EX[12])')]
+        if station_data.empty:
+            return
+        precip = self._in_range(data['precip'], 'Date & Time [UTC]', start, end)
+        module.create_station_plot(station_data, precip, f'Station {station_num:02d}', output=buffer, dpi=dpi)
+
+    def _render_water_content(self, data, station_num, signature, start, end, dpi, buffer):
+        module = importlib.import_module('water_content_precip_dual_axis')
+        station_data, low, high = self.logger_frames(station_num, signature)
+        station_data = self._in_range(station_data, 'Time', start, end)
+        if station_data.empty:
+            return
+        envelope = None
+        if low is not None:
+            envelope = (self._in_range(low, 'Time', start, end), self._in_range(high, 'Time', start, end))
+        module.create_station_plot(station_data, data['precip'], station_num, envelope=envelope,
+                                   output=buffer, dpi=dpi)
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    # GET /plot?kind=depth&analyte=no3&station=SS-07&start=2024-01-01&end=2024-12-31&dpi=150
+    # GET /plot?kind=water_content&station=7, /plot?kind=nitrate&station=07, GET /health
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/health':
+            self._send(200, json.dumps(self.server.service.cache.stats()).encode(), 'application/json')
+            return
+        if url.path != '/plot':
+            self._send(404, b'not found', 'text/plain')
+            return
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            png, hit = self.server.service.render(params)
+        except (ValueError, KeyError) as exc:
+            self._send(400, str(exc).encode(), 'text/plain')
+            return
+        except FileNotFoundError as exc:
+            self._send(404, str(exc).encode(), 'text/plain')
+            return
+        if not png:
+            self._send(404, b'no data for this selection', 'text/plain')
+            return
+        self._send(200, png, 'image/png', {'X-Cache': 'hit' if hit else 'miss'})
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port=DEFAULT_PORT, cache_bytes=DEFAULT_CACHE_BYTES, host='127.0.0.1'):
+    server = ThreadingHTTPServer((host, port), RenderHandler)
+    server.service = RenderService(cache_bytes)
+    server.service.data()
+    print(f'Serving plots on http://{host}:{port}/plot')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local plot render service')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024))
+    args = parser.parse_args()
+    serve(args.port, args.cache_mb * 1024 * 1024)
@@ -0,0 +1,113 @@
+import atexit
+import io
+import os
+import threading
+import zipfile
+from matplotlib.backends.backend_pdf import PdfPages
+import figure_writer
+from output_profiles import RASTER_FORMATS, rasterize_dense_layers
+
+REPORT_ENV = 'GROUNDWATER_REPORT'
+
+
+class PdfReport:
+    # Every figure becomes one page of a single multipage PDF
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._pages = PdfPages(path)
+        self._lock = threading.Lock()
+
+    def add(self, fig, name, dpi, tight, profile):
+        rasterize_dense_layers(fig)
+        # Figures may arrive from several rendering threads; pages are written one at a time
+        with self._lock:
+            self._pages.savefig(fig, dpi=dpi, bbox_inches='tight' if tight else None)
+            self.count += 1
+            return f'{self.path}#page={self.count}'
+
+    def close(self):
+        self._pages.close()
+        print(f"Report with {self.count} pages saved as '{self.path}'")
+
+
+class ZipReport:
+    # Figures are stored uncompressed (PNG/WebP are already compressed) under their usual file names.
+    # Encoding runs on the background writer; only the archive append is serialised.
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED)
+        self._lock = threading.Lock()
+        self._writer = figure_writer.AsyncFigureWriter()
+
+    def _store(self, name, data):
+        with self._lock:
+            self._zip.writestr(name, data)
+            self.count += 1
+
+    def _encode_and_store(self, rgba, name, dpi, format, pil_kwargs):
+        buffer = io.BytesIO()
+        figure_writer.encode_image(rgba, buffer, dpi, format, pil_kwargs)
+        self._store(name, buffer.getvalue())
+
+    def add(self, fig, name, dpi, tight, profile):
+        name = os.path.normpath(name).replace(os.sep, '/').lstrip('/')
+        if profile['format'] in RASTER_FORMATS:
+            rgba = figure_writer.render_rgba(fig, dpi, tight)
+            self._writer.run(self._encode_and_store, rgba, name, dpi, profile['format'], profile['pil_kwargs'])
+        else:
+            if profile.get('rasterize'):
+                rasterize_dense_layers(fig)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=profile['format'], dpi=dpi, bbox_inches='tight' if tight else None)
+            self._store(name, buffer.getvalue())
+        return f'{self.path}:{name}'
+
+    def close(self):
+        try:
+            self._writer.close()
+        finally:
+            self._zip.close()
+        print(f"Report with {self.count} figures saved as '{self.path}'")
+
+
+_report = None
+_report_lock = threading.Lock()
+_env_checked = False
+
+
+def open_report(path):
+    # One report per run; closed automatically at exit
+    global _report
+    with _report_lock:
+        if _report is not None:
+            raise RuntimeError(f"a report is already open at '{_report.path}'")
+        if path.lower().endswith('.pdf'):
+            _report = PdfReport(path)
+        elif path.lower().endswith('.zip'):
+            _report = ZipReport(path)
+        else:
+            raise ValueError(f"report path must end in .pdf or .zip, got '{path}'")
+        atexit.register(close_report)
+        return _report
+
+
+def active_report():
+    # GROUNDWATER_REPORT opens the report on the first saved figure, once per process
+    global _env_checked
+    if not _env_checked:
+        with _report_lock:
+            path = None if _env_checked or _report is not None else os.environ.get(REPORT_ENV)
+            _env_checked = True
+        if path:
+            open_report(path)
+    return _report
+
+
+def close_report():
+    global _report
+    with _report_lock:
+        report, _report = _report, None
+    if report is not None:
+        report.close()
@@ -0,0 +1,56 @@
+import argparse
+import math
+from depth_profiles import analyte_frame, date_colorbar, date_scale, draw_depth_profile, site_slices
+from figure_writer import flush_figures, new_figure, save_figure
+from groundwater_io import ANALYTES, STATION_NUMBERS, load_united_compact, station_code
+
+# Panels per row; the 19 registered analytes wrap onto two rows that share one depth axis
+N_COLS = 10
+
+
+def plot_station_panels(station_df, station, keys=None, output=None, dpi=None, scale=None):
+    # station_df is the station's slice of United, taken once by the caller and reused for every panel;
+    # scale is the dataset-wide date scale (default: the station's own date range)
+    keys = list(keys or ANALYTES)
+    print(f"\n--- {station} ---")
+    print(f"Number of records: {len(station_df)}")
+    frames = {key: analyte_frame(station_df, key) for key in keys}
+    frames = {key: frame for key, frame in frames.items() if not frame.empty}
+    if not frames:
+        print(f"No valid data found for {station} stations\n")
+        return None
+    scale = scale or date_scale(station_df['Date'])
+    n_cols = min(N_COLS, len(frames))
+    n_rows = math.ceil(len(frames) / n_cols)
+    fig = new_figure(figsize=(2.4 * n_cols, 5.5 * n_rows))
+    axes = fig.subplots(n_rows, n_cols, sharey=True, squeeze=False)
+    for ax, (key, frame) in zip(axes.flat, frames.items()):
+        draw_depth_profile(ax, frame, scale, marker_size=25)
+        ax.set_title(ANALYTES[key]['label'], fontsize=10, fontweight='bold')
+        ax.tick_params(labelsize=8)
+    for ax in axes.flat[len(frames):]:
+        ax.set_visible(False)
+    axes[0, 0].invert_yaxis()
+    for ax in axes[:, 0]:
+        ax.set_ylabel('Depth (m)', fontsize=12, fontweight='bold')
+    date_colorbar(fig, scale, ax=axes.ravel().tolist(), fraction=0.015, pad=0.01)
+    fig.suptitle(f'Depth Profiles of All Analytes for {station} Stations', fontsize=14, fontweight='bold')
+    outname = save_figure(fig, output or f'all_analytes_depth_profiles_{station.lower()}.png', dpi=dpi)
+    print(f"Plotted {len(frames)} analyte panels for {station}.")
+    print(f"Plot has been saved as '{outname}'")
+    return outname
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='One figure per station with a depth panel for every analyte')
+    parser.add_argument('stations', nargs='*', metavar='station', help='station codes, e.g. SS-07 (default: all)')
+    args = parser.parse_args()
+    df = load_united_compact()
+    slices = site_slices(df)
+    scale = date_scale(df['Date'])
+    for station in args.stations or [station_code(n) for n in STATION_NUMBERS]:
+        if station not in slices:
+            print(f"\n--- {station} ---\nNo valid data found for {station} stations\n")
+            continue
+        plot_station_panels(slices[station], station, scale=scale)
+    flush_figures()